@@ -2,6 +2,8 @@ import dash
 from dash import html, dcc, register_page, callback, Input, Output
 from dash import Dash, page_container, dash_table
 
+from functions import background_jobs, predictor
+
 external_stylesheets = [
     "https://fonts.googleapis.com/css2?family=Inter&display=swap",
     "https://unpkg.com/modern-css-reset/dist/reset.min.css"
@@ -11,10 +13,14 @@ app = Dash(
     __name__,
     use_pages=True,
     suppress_callback_exceptions=True,
-    external_stylesheets=external_stylesheets
+    external_stylesheets=external_stylesheets,
+    background_callback_manager=background_jobs.manager()
 )
 server = app.server
 
+# `kill -HUP <pid>` makes the workers look for a new model at once, see functions/model_registry.py
+predictor.install_reload_signal()
+
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
     dcc.Store(id='manual-store', storage_type='session'),
@@ -0,0 +1,52 @@
+// Callbacks that only change how the page looks, run in the browser instead of on the server.
+// Registered in the pages with clientside_callback(ClientsideFunction('resale', <name>), ...)
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    resale: {
+        // zebra-striping of a transaction table, with its active row highlighted
+        style_active_row: function(active_cell) {
+            const style = [
+                {'if': {'row_index': 'odd'}, 'backgroundColor': '#fcfcfc'},
+                {'if': {'row_index': 'even'}, 'backgroundColor': '#f9f9f9'}
+            ];
+            if (active_cell) {
+                style.push({
+                    'if': {'row_index': active_cell.row},
+                    'backgroundColor': '#7F0019',
+                    'color': 'white',
+                    'borderTop': '2px solid #dddddd'
+                });
+            }
+            return style;
+        },
+
+        // shows the manual input form or the PropertyGuru one
+        toggle_input_containers: function(mode) {
+            const shown = {'display': 'block', 'width': '600px', 'margin': '0 auto', 'textAlign': 'left'};
+            const hidden = {'display': 'none', 'width': '600px', 'margin': '0 auto', 'textAlign': 'left'};
+            return mode === 'manual' ? [shown, hidden] : [hidden, shown];
+        },
+
+        // every town, the one picked in the other dropdown disabled so the two differ
+        town_options: function(other_town, metadata) {
+            return metadata.towns.map(function(option) {
+                if (!other_town) {
+                    return option;
+                }
+                return Object.assign({}, option, {'disabled': option.value === other_town});
+            });
+        },
+
+        // flat types sold in both towns
+        flat_type_options: function(town1, town2, metadata) {
+            if (!town1 || !town2) {
+                return [];
+            }
+            const sold1 = metadata.town_flat_types[town1] || [];
+            const sold2 = metadata.town_flat_types[town2] || [];
+            return metadata.flat_types.filter(function(option) {
+                return sold1.includes(option.value) && sold2.includes(option.value);
+            });
+        }
+    }
+});
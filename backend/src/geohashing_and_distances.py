@@ -1,36 +1,31 @@
 """
 will be getting 3 types of distances information 
 1. nearest distance to a good school 
-2. nearest distance to mrt (will use geohash to make it faster)
+2. nearest distance to mrt (will use geohash to make it faster, only counting stations already open)
 3. distance to cbd
 """
 
+import os
+import sys
 import pandas as pd
-from geopy.distance import geodesic
-from math import inf
+
+# shared distance helpers live in the app's functions folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from functions.amenity_index import TemporalAmenityIndex
+from functions.distances import distance_to, nearest
 
 # fixed datasets of the amenities will be put here
 good_schools = pd.read_csv('../data/geocoded_schools.csv')
 mrt_stations = pd.read_csv("../data/mrt_stations.csv")      # already done geohashing here to save some time
 mrt_stations['date'] = pd.to_datetime(mrt_stations['date'])
+mrt_by_date = TemporalAmenityIndex(mrt_stations, 'station_name', index_type='geohash')   # nearest open station, from geohash buckets
 
 cbd_coords = (1.287953, 103.851784)
 
 
 # dist totop school
 def dist_good_school(hdb_df):
-    dist_sch = []
-
-    for hdb_row in hdb_df.itertuples(index=False):
-        hdb_coords = (hdb_row.latitude, hdb_row.longitude)
-        min_dist = float(inf)
-
-        for sch_row in good_schools.itertuples(index=False):
-            sch_coords = (sch_row.latitude, sch_row.longitude)
-            dist = geodesic(hdb_coords, sch_coords).km
-            min_dist = min(min_dist, dist)
-
-        dist_sch.append(min_dist)
+    dist_sch, _ = nearest(hdb_df, good_schools)
 
     hdb_df["min_dist_sch"] = dist_sch
     return hdb_df
@@ -38,13 +33,7 @@ def dist_good_school(hdb_df):
 
 # distance to CBD area, which we define as the downtown core of SG
 def dist_to_cbd(hdb_df):
-    dist_cbd = []
-
-    for hdb_row in hdb_df.itertuples(index=False):
-        hdb_coords = (hdb_row.latitude, hdb_row.longitude)
-        dist = geodesic(hdb_coords, cbd_coords).km
-
-        dist_cbd.append(dist)
+    dist_cbd = distance_to(hdb_df, cbd_coords)
 
     hdb_df["min_dist_cbd"] = dist_cbd
     return hdb_df
@@ -52,37 +41,7 @@ def dist_to_cbd(hdb_df):
 
 # distance to nearest MRT, checking first for whether the MRT has opened 
 def dist_nearest_mrt(hdb_df):
-
-    nearest_mrt_dist = []
-    #count = 0
-    for hdb_row in hdb_df.itertuples(index=False):
-        #count += 1
-        #print(count)
-
-        hdb_hash = hdb_row.geohash[:5]
-        resale_date = hdb_row.date
-        hdb_coords = (hdb_row.latitude, hdb_row.longitude)
-        min_distance = float('inf')
-
-        open_mrts = mrt_stations[mrt_stations['date'] <= resale_date]
-
-        mrt_near = []
-        for stn in open_mrts.itertuples(index=False):
-            if stn.geohash[:5] == hdb_hash:
-              mrt_near.append(stn)
-
-        if len(mrt_near) == 0: filtered_mrts = open_mrts
-        else: filtered_mrts = pd.DataFrame(mrt_near)
-
-        #print(filtered_mrts)
-
-        for mrt_row in filtered_mrts.itertuples(index=False):
-            mrt_coords = (mrt_row.latitude, mrt_row.longitude)
-            dist = geodesic(hdb_coords, mrt_coords).km
-            min_distance = min(min_distance, dist)
-
-        nearest_mrt_dist.append(min_distance)
+    nearest_mrt_dist, _ = mrt_by_date.nearest_many(hdb_df, hdb_df['date'])
 
     hdb_df["min_dist_mrt"] = nearest_mrt_dist
     return hdb_df
-
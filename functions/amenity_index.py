@@ -0,0 +1,169 @@
+"""
+Spatial index over the amenity datasets so nearest lookups don't scan every row per callback.
+
+Each amenity layer (schools, MRT exits, hawker centres, ...) is projected once to web mercator
+and stored in a KD-tree. The tree only proposes candidates, which are then re-ranked with the
+exact geodesic distance, so the results match a full scan with functions.distances.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from functions import data_registry
+from functions.geohash_index import GeohashIndex
+from functions.distances import (SPHERE_TOLERANCE, as_points, distance_matrix, mercator_scale,
+                                 paired_distances, to_mercator)
+
+# (layer, also its dataset in the data registry, column holding the amenity name)
+AMENITY_LAYERS = [
+    ('school', 'school'),
+    ('mrt', 'station_name'),
+    ('hawker', 'hc_name'),
+]
+
+
+class AmenityIndex:
+    """KD-tree per amenity layer, built once and shared by every page."""
+
+    def __init__(self, method='geodesic'):
+        self.method = method
+        self.layers = {}
+
+    def add_layer(self, layer, df, name_col, lat_col='latitude', lon_col='longitude'):
+        df = df.dropna(subset=[lat_col, lon_col]).reset_index(drop=True)
+        points = as_points(df, lat_col, lon_col)
+        self.layers[layer] = {
+            'df': df,
+            'names': df[name_col].to_numpy(),
+            'points': points,
+            'tree': cKDTree(to_mercator(points)),
+        }
+        return self
+
+    def _layer(self, layer):
+        try:
+            return self.layers[layer]
+        except KeyError:
+            raise ValueError(f"Unknown amenity layer '{layer}', expected one of {list(self.layers)}")
+
+    def _rerank(self, data, point, candidates):
+        dist = distance_matrix(point, data['points'][candidates], self.method)[0]
+        order = np.argsort(dist, kind='stable')
+        return dist[order], candidates[order]
+
+    def nearest(self, layer, point, k=1):
+        """The k closest amenities to a single point, as (distances in km, row indices) sorted by distance."""
+        data = self._layer(layer)
+        point = as_points(point)
+        k = min(k, len(data['points']))
+        if k == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+
+        # anything within the tolerance of the k-th mercator distance could still be in the exact top k
+        merc = to_mercator(point)[0]
+        merc_dist, _ = data['tree'].query(merc, k=[k])
+        reach = merc_dist[-1] * (1 + SPHERE_TOLERANCE) + 1e-6
+        candidates = np.asarray(data['tree'].query_ball_point(merc, r=reach), dtype=np.int64)
+        dist, idx = self._rerank(data, point, candidates)
+        return dist[:k], idx[:k]
+
+    def within_radius(self, layer, point, radius_km):
+        """Every amenity within radius_km of a single point, as (distances in km, row indices) sorted by distance."""
+        data = self._layer(layer)
+        point = as_points(point)
+        reach = radius_km * 1000 * mercator_scale(point[0, 0]) * (1 + SPHERE_TOLERANCE)
+        candidates = np.asarray(data['tree'].query_ball_point(to_mercator(point)[0], r=reach), dtype=np.int64)
+        dist, idx = self._rerank(data, point, candidates)
+        keep = dist <= radius_km
+        return dist[keep], idx[keep]
+
+    def nearest_with_name(self, layer, point):
+        """Closest amenity as (name, distance in km, (lat, lon)), or (None, inf, (None, None)) for an empty layer."""
+        dist, idx = self.nearest(layer, point, k=1)
+        if len(idx) == 0:
+            return None, float('inf'), (None, None)
+        data = self._layer(layer)
+        lat, lon = data['points'][idx[0]]
+        return data['names'][idx[0]], float(dist[0]), (float(lat), float(lon))
+
+    def nearest_many(self, layer, points):
+        """Closest amenity for many points at once, as (distances in km, row indices)."""
+        data = self._layer(layer)
+        points = as_points(points)
+        merc = to_mercator(points)
+        merc_dist, _ = data['tree'].query(merc, k=1)
+        reach = merc_dist * (1 + SPHERE_TOLERANCE) + 1e-6
+        candidates = data['tree'].query_ball_point(merc, r=reach)
+
+        # score every (point, candidate) pair in one call, then take the closest per point
+        counts = np.array([len(cand) for cand in candidates])
+        rows = np.repeat(np.arange(len(points)), counts)
+        cols = np.concatenate(candidates).astype(np.int64)
+        dist = paired_distances(points[rows], data['points'][cols], self.method)
+        order = np.lexsort((dist, rows))
+        first = order[np.concatenate([[0], np.cumsum(counts)[:-1]])]
+        return dist[first], cols[first]
+
+
+class TemporalAmenityIndex:
+    """
+    Nearest amenity that was already open on a given date, e.g. MRT stations by opening date.
+    Points are sorted by date and one spatial index is kept per distinct date, covering every
+    point opened on or before it, so an as-of query never sees a station before it opens.
+    index_type picks the per-date index: 'kdtree', or 'geohash' for layers with a geohash column.
+    """
+
+    def __init__(self, df, name_col, date_col='date', lat_col='latitude', lon_col='longitude',
+                 method='geodesic', index_type='kdtree'):
+        df = df.dropna(subset=[lat_col, lon_col, date_col]).copy()
+        df[date_col] = pd.to_datetime(df[date_col])
+        self.df = df.sort_values(date_col, kind='stable').reset_index(drop=True)
+        dates = self.df[date_col].to_numpy()
+        self.epochs = np.unique(dates)
+        ends = np.searchsorted(dates, self.epochs, side='right')
+
+        # row indices of every epoch line up with self.df, since each epoch is a prefix of it
+        if index_type == 'geohash':
+            self.indexes = [GeohashIndex(self.df.iloc[:end], lat_col, lon_col, method=method) for end in ends]
+            self._nearest_many = lambda epoch, points: self.indexes[epoch].nearest_many(points)
+        elif index_type == 'kdtree':
+            self.index = AmenityIndex(method)
+            for epoch, end in enumerate(ends):
+                self.index.add_layer(epoch, self.df.iloc[:end], name_col, lat_col, lon_col)
+            self._nearest_many = self.index.nearest_many
+        else:
+            raise ValueError(f"Unknown index type '{index_type}', expected 'kdtree' or 'geohash'")
+
+    def epoch_of(self, dates):
+        """Position of the latest epoch on or before each date, -1 if nothing was open yet."""
+        dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+        return np.searchsorted(self.epochs, dates, side='right') - 1
+
+    def nearest_many(self, points, dates):
+        """Closest point open on each date, as (distances in km, row indices into self.df)."""
+        points = as_points(points)
+        epochs = self.epoch_of(dates)
+        min_dist = np.full(len(points), np.inf)
+        argmin = np.full(len(points), -1, dtype=np.int64)
+
+        # one vectorised query per epoch, covering every point sold in it
+        for epoch in np.unique(epochs[epochs >= 0]):
+            rows = np.flatnonzero(epochs == epoch)
+            min_dist[rows], argmin[rows] = self._nearest_many(epoch, points[rows])
+        return min_dist, argmin
+
+
+def build_amenity_index(layers=AMENITY_LAYERS):
+    index = AmenityIndex()
+    for layer, name_col in layers:
+        index.add_layer(layer, data_registry.get(layer), name_col)
+    return index
+
+
+@lru_cache(maxsize=None)
+def get_amenity_index():
+    """The app-wide index, built on first use (at startup, when the pages import it) and shared after."""
+    return build_amenity_index()
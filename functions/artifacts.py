@@ -0,0 +1,55 @@
+"""
+Build artifacts derived from the datasets, written to dataset/build/ by the offline jobs
+(python -m functions.<module>) and read back by the app at startup.
+
+Artifacts are plain .npz files of numpy arrays, so loading them needs no pickling, or Parquet
+files for whole datasets. Large arrays are written as a directory of .npy files instead, which
+every worker memory-maps rather than reads. An artifact older than any of the datasets it was
+built from is treated as missing.
+"""
+
+import json
+import os
+
+import numpy as np
+
+BUILD_DIR = "dataset/build"
+
+
+def artifact_path(name, ext='npz'):
+    return os.path.join(BUILD_DIR, f"{name}.{ext}")
+
+
+def is_stale(path, sources):
+    """True if the artifact is missing or older than any of its source files."""
+    return not os.path.exists(path) or os.path.getmtime(path) < max(os.path.getmtime(src) for src in sources)
+
+
+def save_arrays(path, arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, **arrays)
+
+
+def load_arrays(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def array_dir_index(path):
+    """File written last into an array directory, the one to check with is_stale()."""
+    return os.path.join(path, "index.json")
+
+
+def save_array_dir(path, arrays):
+    os.makedirs(path, exist_ok=True)
+    for key, values in arrays.items():
+        np.save(os.path.join(path, f"{key}.npy"), values)
+    with open(array_dir_index(path), "w") as f:
+        json.dump(sorted(arrays), f)
+
+
+def map_array_dir(path):
+    """Read-only memory maps of the arrays written by save_array_dir()."""
+    with open(array_dir_index(path)) as f:
+        keys = json.load(f)
+    return {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r') for key in keys}
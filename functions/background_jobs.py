@@ -0,0 +1,60 @@
+"""
+Job manager of the background callbacks, the ones too slow to run in a request thread (reading
+a PropertyGuru listing sleeps 2-5 s before each of up to 10 attempts).
+
+    @callback(Output('result', 'children'), Input('submit', 'n_clicks'), background=True,
+              progress=Output('status', 'children'), cancel=Input('cancel', 'n_clicks'))
+    def submit(set_progress, n_clicks):
+        ...
+
+The request that starts a background callback returns at once with a job id. The callback runs
+in a process of its own, and the browser polls for its progress and result every POLL_INTERVAL
+ms; clicking a cancel input, or starting the callback again, kills that process. Jobs, their
+progress and results are kept in a diskcache directory (BACKGROUND_JOBS, dataset/build/jobs by
+default), so any worker of the host can answer the polls of a job another worker started.
+
+Slow steps of a job are cached with remember(), for every worker and job process of the host,
+in a cache of their own (the steps/ subdirectory), so a burst of them never evicts the result of
+a job before the browser has polled for it. The callbacks' results themselves are not cached: a
+step that failed is retried the next time instead of its error being served.
+"""
+
+import os
+from functools import lru_cache
+
+import diskcache
+from dash import DiskcacheManager
+
+from functions.artifacts import BUILD_DIR
+from functions.callback_cache import DAY, MISSING, cache_key
+
+JOBS_DIR = os.environ.get("BACKGROUND_JOBS", os.path.join(BUILD_DIR, "jobs"))
+MAX_BYTES = 256 * 2 ** 20
+POLL_INTERVAL = 500
+
+
+@lru_cache(maxsize=None)
+def job_cache():
+    return diskcache.Cache(JOBS_DIR, size_limit=MAX_BYTES)
+
+
+@lru_cache(maxsize=None)
+def step_cache():
+    return diskcache.Cache(os.path.join(JOBS_DIR, "steps"), size_limit=MAX_BYTES)
+
+
+@lru_cache(maxsize=None)
+def manager():
+    """The app's background_callback_manager."""
+    return DiskcacheManager(job_cache())
+
+
+def remember(name, key, compute, ttl=DAY):
+    """compute()'s result, cached by name and (JSON-like) key for ttl seconds. None and exceptions are not cached."""
+    full_key = cache_key(name, [key], {})
+    value = step_cache().get(full_key, MISSING)
+    if value is MISSING:
+        value = compute()
+        if value is not None:
+            step_cache().set(full_key, value, expire=ttl)
+    return value
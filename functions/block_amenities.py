@@ -0,0 +1,101 @@
+"""
+Nearest school, MRT, hawker centre and CBD distance of every block in hdb_informations.csv,
+computed once and looked up by postal code.
+
+The amenities of a block never change between deploys, so they are materialised into
+dataset/build/block_amenities.npz by running, from the repo root:
+
+    python -m functions.block_amenities
+
+The pages load that file at startup and every lookup is a dictionary hit. If the file is
+missing or older than the datasets it was built from, the table is rebuilt in memory instead.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from functions import data_registry
+from functions.amenity_index import AMENITY_LAYERS, get_amenity_index
+from functions.artifacts import artifact_path, is_stale, load_arrays, save_arrays
+from functions.distances import as_points, distance_to
+from functions.postal_index import postal_key
+
+TABLE_PATH = artifact_path("block_amenities")
+
+CBD_COORDS = (1.287953, 103.851784)
+
+LAYERS = [layer for layer, _ in AMENITY_LAYERS]
+SOURCES = [data_registry.path(name) for name in ['blocks'] + LAYERS]
+
+
+def build_table(hdb_info=None, index=None):
+    """Nearest amenities of every block, as a dict of equal length numpy arrays."""
+    if hdb_info is None:
+        hdb_info = data_registry.get('blocks')
+    if index is None:
+        index = get_amenity_index()
+    hdb_info = hdb_info.dropna(subset=['latitude', 'longitude'])
+    points = as_points(hdb_info)
+
+    table = {
+        'postal_code': np.array([postal_key(p) for p in hdb_info['postal_code']]),
+        'address': hdb_info['address'].astype(str).to_numpy(dtype=str),
+        'latitude': points[:, 0],
+        'longitude': points[:, 1],
+        'cbd_dist': distance_to(points, CBD_COORDS),
+    }
+    # per block only the row of its nearest amenity is kept, names and coords are stored once per layer
+    for layer in LAYERS:
+        dist, idx = index.nearest_many(layer, points)
+        data = index.layers[layer]
+        table[f'{layer}_idx'] = idx.astype(np.int32)
+        table[f'{layer}_dist'] = dist
+        table[f'{layer}_names'] = data['names'].astype(str)
+        table[f'{layer}_points'] = data['points']
+    return table
+
+
+class BlockAmenities:
+    """Postal code -> nearest amenities, built from the arrays of build_table()."""
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = {postal: row for row, postal in enumerate(table['postal_code'])}
+
+    def __contains__(self, postal_code):
+        return postal_key(postal_code) in self.rows
+
+    def get(self, postal_code):
+        """
+        Nearest amenities of a block, or None if the postal code is not in the table.
+        Each amenity is (name, distance in km, (lat, lon)), alongside the block's 'coords',
+        'cbd_dist' and 'address'.
+        """
+        row = self.rows.get(postal_key(postal_code))
+        if row is None:
+            return None
+        t = self.table
+        result = {}
+        for layer in LAYERS:
+            idx = t[f'{layer}_idx'][row]
+            lat, lon = t[f'{layer}_points'][idx]
+            result[layer] = (str(t[f'{layer}_names'][idx]), float(t[f'{layer}_dist'][row]), (float(lat), float(lon)))
+        result['coords'] = (float(t['latitude'][row]), float(t['longitude'][row]))
+        result['cbd_dist'] = float(t['cbd_dist'][row])
+        result['address'] = str(t['address'][row])
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_block_amenities(path=TABLE_PATH):
+    """The app-wide table, read from the build artifact when it is up to date, else built in memory."""
+    if is_stale(path, SOURCES):
+        return BlockAmenities(build_table())
+    return BlockAmenities(load_arrays(path))
+
+
+if __name__ == "__main__":
+    table = build_table()
+    save_arrays(TABLE_PATH, table)
+    print(f"Wrote {len(table['postal_code'])} blocks to {TABLE_PATH}")
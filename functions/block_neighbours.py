@@ -0,0 +1,95 @@
+"""
+Neighbour graph of every block in hdb_informations.csv, for comparable-sales lookups.
+
+For each block it keeps its NEAREST_BLOCKS nearest blocks (with distances) and every block
+within RADIUS_M, as CSR arrays: the neighbours of block i are ids[indptr[i]:indptr[i + 1]],
+where ids are row positions in hdb_informations.csv. Distances are in metres in web mercator
+(EPSG:3857), the same measure get_transactions has always ranked comparables by.
+
+Built offline, from the repo root, into dataset/build/block_neighbours.npz:
+
+    python -m functions.block_neighbours
+
+and rebuilt in memory at startup if that file is missing or out of date.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from functions import data_registry
+from functions.artifacts import artifact_path, is_stale, load_arrays, save_arrays
+from functions.distances import to_mercator
+from functions.postal_index import postal_key
+
+GRAPH_PATH = artifact_path("block_neighbours")
+
+NEAREST_BLOCKS = 50
+RADIUS_M = 1000
+
+
+def _csr(rows):
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    return indptr
+
+
+def build_graph(hdb_info=None, k=NEAREST_BLOCKS, radius_m=RADIUS_M):
+    """k-nearest and radius neighbours of every block, as a dict of CSR numpy arrays."""
+    if hdb_info is None:
+        hdb_info = data_registry.get('blocks')
+    xy = to_mercator(hdb_info)
+    tree = cKDTree(xy)
+
+    k = min(k, len(xy))
+    knn_dist, knn_ids = tree.query(xy, k=k)
+    knn_dist, knn_ids = knn_dist.reshape(len(xy), k), knn_ids.reshape(len(xy), k)
+
+    radius_ids = tree.query_ball_point(xy, r=radius_m, return_sorted=True)
+    return {
+        'postal_code': np.array([postal_key(p) for p in hdb_info['postal_code']]),
+        'radius_m': np.array(radius_m, dtype=float),
+        'knn_indptr': np.arange(0, k * len(xy) + 1, k, dtype=np.int64),
+        'knn_ids': knn_ids.ravel().astype(np.int32),
+        'knn_dist': knn_dist.ravel(),
+        'radius_indptr': _csr(radius_ids),
+        'radius_ids': np.concatenate(radius_ids).astype(np.int32) if len(xy) else np.empty(0, dtype=np.int32),
+    }
+
+
+class BlockNeighbours:
+    """Neighbour lists of a block by postal code, each an array slice of the CSR graph."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.rows = {postal: row for row, postal in enumerate(graph['postal_code'])}
+
+    def row_of(self, postal_code):
+        """Row of a postal code in hdb_informations.csv, or None if it is not in the graph."""
+        return self.rows.get(postal_key(postal_code))
+
+    def nearest(self, row):
+        """(ids, distances in metres) of the nearest blocks to a block, closest first."""
+        start, end = self.graph['knn_indptr'][row], self.graph['knn_indptr'][row + 1]
+        return self.graph['knn_ids'][start:end], self.graph['knn_dist'][start:end]
+
+    def within_radius(self, row):
+        """ids of every block within the graph's radius of a block."""
+        start, end = self.graph['radius_indptr'][row], self.graph['radius_indptr'][row + 1]
+        return self.graph['radius_ids'][start:end]
+
+
+@lru_cache(maxsize=None)
+def get_block_neighbours(path=GRAPH_PATH):
+    """The app-wide graph, read from the build artifact when it is up to date, else built in memory."""
+    if is_stale(path, [data_registry.path('blocks')]):
+        return BlockNeighbours(build_graph())
+    return BlockNeighbours(load_arrays(path))
+
+
+if __name__ == "__main__":
+    graph = build_graph()
+    save_arrays(GRAPH_PATH, graph)
+    print(f"Wrote neighbours of {len(graph['postal_code'])} blocks "
+          f"({len(graph['knn_ids'])} nearest, {len(graph['radius_ids'])} within {RADIUS_M} m) to {GRAPH_PATH}")
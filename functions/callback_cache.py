@@ -0,0 +1,246 @@
+"""
+Cache of callback outputs, so identical requests from any session are served without recomputing.
+
+    @callback(Output('quarterly-bar-chart', 'figure'), Input('user-filter-store', 'data'))
+    @cached(ttl=24 * 60 * 60)
+    def update_quarterly_chart(filter_data):
+        ...
+
+An output is keyed by the function's name, its arguments and the version of the datasets
+(data_registry.version()), so a result computed from other data is never served, even from a
+cache shared with workers started before the data changed. Only functions whose outputs depend
+on nothing but their arguments and the datasets can be cached: no ctx.triggered_id, no state
+outside the arguments, no side effects. Exceptions (PreventUpdate included) are raised as usual
+and nothing is cached. A backend that fails is counted as an error and the function is run.
+
+The backend is picked by the CALLBACK_CACHE environment variable:
+1. memory://             in-process LRU, per worker (the default)
+2. disk:///path/to/dir    pickle files in a local directory, shared by the workers of a host
+3. redis://host:6379/0    a Redis server, shared by every host (needs the redis package)
+or set in code with configure(). Values go through pickle on the disk and Redis backends, so
+point them only at a directory or server the app alone writes to.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from plotly.basedatatypes import BaseFigure
+
+from functions import data_registry
+from functions.result_cache import LRUCache
+
+MISSING = object()
+DAY = 24 * 60 * 60
+
+
+def _plain(value):
+    """Plotly figures in an output as the dicts Dash sends for them, far cheaper to pickle and load."""
+    if isinstance(value, BaseFigure):
+        return value.to_plotly_json()
+    if isinstance(value, (tuple, list)):
+        return type(value)(_plain(item) for item in value)
+    return value
+
+
+def _pickled(value):
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class MemoryBackend:
+    """In-process LRU, bounded by entries and by the pickled size of the values."""
+
+    def __init__(self, max_entries=1024, max_bytes=128 * 2 ** 20):
+        self.cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes, sizeof=lambda value: len(_pickled(value)))
+
+    def get(self, key):
+        return self.cache.get(key, MISSING)
+
+    def set(self, key, value, ttl=None):
+        self.cache.put(key, value, ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class DiskBackend:
+    """One pickle file per key in a directory, the least recently used removed past max_bytes."""
+
+    def __init__(self, directory, max_bytes=512 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires, stored_key, value = pickle.load(f)
+        except FileNotFoundError:
+            return MISSING
+        if stored_key != key or (expires is not None and expires <= time.time()):
+            return MISSING
+        os.utime(path)  # the modification time is the last use
+        return value
+
+    def set(self, key, value, ttl=None):
+        blob = _pickled((time.time() + ttl if ttl is not None else None, key, value))
+        if len(blob) > self.max_bytes:
+            return
+        # written to a temporary file and renamed, so other workers never read half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                os.remove(entry.path)
+
+
+class RedisBackend:
+    """
+    Values in a Redis server through any client with the redis-py API (get, set, delete,
+    scan_iter), e.g. redis.Redis or a local stand-in. Expiry is left to Redis, and the memory
+    limit to its maxmemory policy, values over max_value_bytes are not stored.
+    """
+
+    def __init__(self, client, prefix="resalerangers:", max_value_bytes=8 * 2 ** 20):
+        self.client = client
+        self.prefix = prefix
+        self.max_value_bytes = max_value_bytes
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError(f"CALLBACK_CACHE={url} needs the redis package: pip install redis")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        blob = self.client.get(self.prefix + key)
+        return MISSING if blob is None else pickle.loads(blob)
+
+    def set(self, key, value, ttl=None):
+        blob = _pickled(value)
+        if len(blob) <= self.max_value_bytes:
+            self.client.set(self.prefix + key, blob, ex=int(ttl) if ttl is not None else None)
+
+    def clear(self):
+        for name in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(name)
+
+
+def backend_from_url(url):
+    """A backend from a memory://, disk:///path or redis://host:port/db url."""
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme == "disk":
+        return DiskBackend(urlparse(url).path)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBackend.from_url(url)
+    raise ValueError(f"Unknown callback cache '{url}', expected memory://, disk:///path or redis://host:port/db")
+
+
+_backend = None
+_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = backend_from_url(os.environ.get("CALLBACK_CACHE", "memory://"))
+        return _backend
+
+
+def configure(backend):
+    """Use another backend (a backend object or url) for every cached function from now on."""
+    global _backend
+    with _lock:
+        _backend = backend_from_url(backend) if isinstance(backend, str) else backend
+
+
+# function name -> hits, misses and backend errors
+_metrics = defaultdict(lambda: {'hits': 0, 'misses': 0, 'errors': 0})
+
+
+def metrics():
+    """Hits, misses and backend errors of every cached function so far."""
+    with _lock:
+        return {name: dict(counts) for name, counts in _metrics.items()}
+
+
+def _count(name, outcome):
+    with _lock:
+        _metrics[name][outcome] += 1
+
+
+def cache_key(name, args, kwargs):
+    arguments = json.dumps([args, kwargs], sort_keys=True, default=str, separators=(",", ":"))
+    return f"{name}:{data_registry.version()}:{hashlib.sha256(arguments.encode()).hexdigest()}"
+
+
+def cached(ttl=None, name=None):
+    """Decorator caching a function's return value by its (JSON-like) arguments, see the module docstring."""
+
+    def decorate(func):
+        key_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(key_name, args, kwargs)
+            backend = get_backend()
+            try:
+                value = backend.get(key)
+            except Exception:
+                _count(key_name, 'errors')
+                value = MISSING
+            if value is not MISSING:
+                _count(key_name, 'hits')
+                return value
+
+            _count(key_name, 'misses')
+            value = _plain(func(*args, **kwargs))
+            try:
+                backend.set(key, value, ttl)
+            except Exception:
+                _count(key_name, 'errors')
+            return value
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,70 @@
+"""
+Read-only, memory-mapped column store for the datasets, so every worker process shares one copy.
+
+A store is a directory with one .npy file per column and a schema.json describing them:
+1. numeric, boolean and datetime columns are saved as they are
+2. categoricals are saved as their integer codes plus a small file of categories
+3. string columns are dictionary encoded the same way, and come back as categoricals
+
+open_store() maps every column file read-only (np.load(mmap_mode='r')) and wraps the arrays in a
+DataFrame without copying them. The pages are backed by the OS page cache, so all workers on a host
+read the same physical memory, and a new worker only maps the files instead of parsing anything.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_FILE = "schema.json"
+
+
+def schema_path(directory):
+    return os.path.join(directory, SCHEMA_FILE)
+
+
+def write_store(df, directory):
+    """Write a DataFrame (with a default RangeIndex) as a column store."""
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    for pos, col in enumerate(df.columns):
+        values = df[col]
+        entry = {'name': col, 'file': f"{pos}.npy"}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            entry.update(kind='category', ordered=bool(values.cat.ordered))
+            codes, categories = values.cat.codes.to_numpy(), values.cat.categories.to_numpy()
+        elif values.dtype == object:
+            entry.update(kind='category', ordered=False)
+            codes, categories = pd.factorize(values)
+            codes = codes.astype(np.int32)
+        else:
+            entry['kind'] = 'array'
+            codes, categories = values.to_numpy(), None
+
+        np.save(os.path.join(directory, entry['file']), np.ascontiguousarray(codes))
+        if categories is not None:
+            entry['categories'] = f"{pos}.categories.npy"
+            categories = np.asarray(categories)
+            np.save(os.path.join(directory, entry['categories']),
+                    categories.astype(str) if categories.dtype == object else categories)
+        columns.append(entry)
+
+    # the schema goes last, a store without one is incomplete
+    with open(schema_path(directory), "w") as f:
+        json.dump({'rows': len(df), 'columns': columns}, f, indent=1)
+
+
+def open_store(directory):
+    """DataFrame whose columns are read-only memory maps of the store's files."""
+    with open(schema_path(directory)) as f:
+        schema = json.load(f)
+
+    columns = {}
+    for entry in schema['columns']:
+        values = np.load(os.path.join(directory, entry['file']), mmap_mode='r')
+        if entry['kind'] == 'category':
+            categories = np.load(os.path.join(directory, entry['categories'])).astype(object)
+            values = pd.Categorical.from_codes(values, categories=categories, ordered=entry['ordered'])
+        columns[entry['name']] = values
+    return pd.DataFrame(columns, index=pd.RangeIndex(schema['rows']), copy=False)
@@ -0,0 +1,265 @@
+"""
+Every dataset the app reads, loaded once per process and shared by all pages and functions.
+
+    from functions import data_registry
+    hdb_df = data_registry.get('transactions')
+
+Each dataset is loaded on first use with an explicit schema (categoricals for the repeated
+labels, int32 postal codes, real datetimes), and its numeric columns are made read-only.
+get() hands out a shallow view, so a module can add or replace columns, filter or merge as
+usual without copying the data, but can't change values shared with everyone else in place
+(that raises "assignment destination is read-only", take a .copy() first).
+
+The schema is applied once by the build step, which writes every dataset to dataset/build/ both
+as Parquet and as a memory-mapped column store (functions/column_store.py). The app maps the
+column store by default, so all worker processes on a host share the same pages, then falls
+back to the Parquet file, and parses the CSV only if both are missing or older than it.
+From the repo root:
+
+    python -m functions.data_registry build    # write the Parquet files and column stores
+    python -m functions.data_registry          # load times and memory use
+"""
+
+import hashlib
+import os
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from functions.artifacts import artifact_path, is_stale
+from functions.column_store import open_store, schema_path, write_store
+
+FLAT_TYPES = ['flat_type_1 ROOM', 'flat_type_2 ROOM', 'flat_type_3 ROOM', 'flat_type_4 ROOM',
+              'flat_type_5 ROOM', 'flat_type_EXECUTIVE', 'flat_type_MULTI-GENERATION']
+
+COORDS = {'latitude': 'float64', 'longitude': 'float64'}
+
+# Resale transactions, flat types are one-hot. 'month' stays a 'YYYY-MM' string for the pages,
+# the schema adds the columns in _derive_transactions() on top
+TRANSACTION_DTYPES = {
+    'month': str, 'town': str, 'block': str, 'street_name': str, 'storey_range': str,
+    'flat_model': str, 'address': str, 'geohash': str,
+    'postal_code': 'int32',
+    'floor_area_sqm': 'float64', 'storey_median': 'float64',
+    'adjusted_resale_price': 'float64', 'adj_resale_price_per_sqm': 'float64',
+    'min_dist_sch': 'float64', 'min_dist_mrt': 'float64', 'min_dist_cbd': 'float64',
+    **COORDS,
+    **{flat: 'bool' for flat in FLAT_TYPES},
+}
+
+# One row per block, flat types are the number of units of that type
+BLOCK_DTYPES = {
+    'blk_no': str, 'street': str, 'bldg_contract_town': str, 'address': str, 'geohash': str,
+    'postal_code': 'int32', 'max_floor_lvl': 'int32', 'year_completed': 'int32',
+    **COORDS,
+    **{flat: 'int32' for flat in FLAT_TYPES},
+}
+
+TRANSACTION_CATEGORIES = ['town', 'flat_type', 'storey_range', 'flat_model', 'display_address']
+
+# Floor level of a transaction within its block, the 'floor_level' filter of the town pages
+FLOOR_CATEGORIES = ['Low', 'Medium', 'High']
+
+# name -> (csv path, dtypes, columns stored as categoricals, columns the rows are sorted by)
+# The transactions are kept in two physical orders: by postal code for block lookups
+# (functions/postal_index.py), and partitioned by town, flat type and month for the
+# town-level pages (functions/transaction_partitions.py)
+DATASETS = {
+    'transactions': ("dataset/hdb_final_dataset.csv", TRANSACTION_DTYPES, TRANSACTION_CATEGORIES, ['postal_code']),
+    'transactions_by_town': ("dataset/hdb_final_dataset.csv", TRANSACTION_DTYPES, TRANSACTION_CATEGORIES,
+                             ['town', 'flat_type', 'month']),
+    'blocks': ("dataset/hdb_informations.csv", BLOCK_DTYPES, ['bldg_contract_town'], []),
+    'school': ("dataset/all_primary_schools.csv", {'school': str, 'address': str, 'postal_code': str, **COORDS}, [], []),
+    'mrt': ("dataset/mrt_stations.csv", {'station_name': str, 'station_small': str, 'date': str, 'geohash': str, **COORDS}, [], []),
+    'hawker': ("dataset/hawkercentercoord.csv", {'hc_name': str, **COORDS}, [], []),
+}
+
+# Datasets with columns derived from another dataset, and so rebuilt when that one changes
+DERIVED_FROM = {'transactions': ['blocks'], 'transactions_by_town': ['blocks']}
+
+load_seconds = {}
+
+
+def path(name):
+    try:
+        return DATASETS[name][0]
+    except KeyError:
+        raise ValueError(f"Unknown dataset '{name}', expected one of {list(DATASETS)}")
+
+
+def sources(name):
+    """CSV files a dataset is built from."""
+    return [path(name)] + [path(other) for other in DERIVED_FROM.get(name, [])]
+
+
+# Bumped whenever _typed() changes, so files built with an older schema are ignored
+SCHEMA_VERSION = 3
+
+
+def parquet_path(name):
+    return artifact_path(f"{name}.v{SCHEMA_VERSION}", 'parquet')
+
+
+def store_path(name):
+    return artifact_path(f"{name}.v{SCHEMA_VERSION}", 'store')
+
+
+def _derive_transactions(df):
+    """
+    Columns computed once per transaction, so the pages only filter and group by them:
+    1. 'date', the month as a datetime, and 'quarter' ('Q2 2024'), in order
+    2. 'flat_type', the label of the one-hot flat type columns
+    3. 'max_floor_lvl' of the block and 'floor_category', Low / Medium / High: up to a quarter of
+       the way up the block, above three quarters of the way up, or in between
+    4. 'display_address', the address as the town pages show it ('174 Ang Mo Kio Ave 4')
+    """
+    df['date'] = pd.to_datetime(df['month'], format="%Y-%m")
+    quarter = df['date'].dt.to_period('Q')
+    labels = {period: f"Q{period.quarter} {period.year}" for period in sorted(quarter.dropna().unique())}
+    df['quarter'] = pd.Categorical(quarter.map(labels), categories=list(labels.values()), ordered=True)
+
+    flats = np.array([flat.replace('flat_type_', '') for flat in FLAT_TYPES], dtype=object)
+    one_hot = df[FLAT_TYPES].to_numpy()
+    df['flat_type'] = np.where(one_hot.any(axis=1), flats[one_hot.argmax(axis=1)], None)
+
+    blocks = _load('blocks')
+    df['max_floor_lvl'] = df['postal_code'].map(blocks.set_index('postal_code')['max_floor_lvl'])
+    storey = df['storey_median'].to_numpy(dtype=float)
+    max_floor = df['max_floor_lvl'].to_numpy(dtype=float)
+    floor = np.select([storey <= np.round(max_floor * 0.25), storey > np.round(max_floor * 0.75)],
+                      ['Low', 'High'], 'Medium').astype(object)
+    floor[np.isnan(storey) | np.isnan(max_floor)] = None
+    df['floor_category'] = pd.Categorical(floor, categories=FLOOR_CATEGORIES)
+
+    df['display_address'] = df['block'].astype(str).str.strip() + " " + df['street_name'].str.title()
+    return df
+
+
+def _typed(name, df):
+    """Derived columns, categoricals and row order, applied to a freshly parsed CSV."""
+    _, dtypes, categories, sort_keys = DATASETS[name]
+    if dtypes is TRANSACTION_DTYPES:
+        df = _derive_transactions(df)
+    if name == 'mrt':
+        df['date'] = pd.to_datetime(df['date'])
+    for col in categories:
+        df[col] = pd.Categorical(df[col], categories=sorted(df[col].dropna().unique()))
+    # stable, so rows with equal keys keep their order in the CSV
+    if sort_keys:
+        df = df.sort_values(sort_keys, kind='stable', ignore_index=True)
+    return df
+
+
+def read_csv(name):
+    """A dataset parsed from its CSV, with the full schema."""
+    csv, dtypes = DATASETS[name][:2]
+    return _typed(name, pd.read_csv(csv, dtype=dtypes))
+
+
+def build(names=None):
+    """Write every dataset with its schema to dataset/build/<name>.v<SCHEMA_VERSION>.parquet and .store/."""
+    for name in names or DATASETS:
+        df = read_csv(name)
+        os.makedirs(os.path.dirname(parquet_path(name)), exist_ok=True)
+        df.to_parquet(parquet_path(name), index=False)
+        write_store(df, store_path(name))
+
+
+def _read_only(df):
+    """
+    Same frame, with its numeric, boolean and datetime columns backed by read-only arrays
+    (memory-mapped columns already are, and are not copied). String columns are left writable,
+    pandas' C routines for object arrays need a writable buffer.
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col].array
+        if isinstance(df[col].dtype, np.dtype) and df[col].dtype != object:
+            values = df[col].to_numpy()
+            if values.flags.writeable:
+                values = values.copy()
+                values.flags.writeable = False
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+@lru_cache(maxsize=None)
+def _load(name):
+    start = time.perf_counter()
+    if not is_stale(schema_path(store_path(name)), sources(name)):
+        df = open_store(store_path(name))
+    elif not is_stale(parquet_path(name), sources(name)):
+        df = pd.read_parquet(parquet_path(name))
+    else:
+        df = read_csv(name)
+    df = _read_only(df)
+    load_seconds[name] = time.perf_counter() - start
+    return df
+
+
+def get(name):
+    """Shared, read-only view of a dataset, loaded on first use."""
+    path(name)
+    return _load(name).copy(deep=False)
+
+
+@lru_cache(maxsize=None)
+def index(name, column):
+    """value -> row positions of that value in the dataset, for lookups without scanning a column."""
+    return {key: np.asarray(rows) for key, rows in _load(name).groupby(column, sort=False, observed=True).indices.items()}
+
+
+@lru_cache(maxsize=None)
+def version():
+    """
+    Short id of the data this process serves: the schema version and the size and modification
+    time of every source CSV. Anything cached outside the process is keyed on it.
+    """
+    digest = hashlib.sha256(f"schema {SCHEMA_VERSION}".encode())
+    for name in DATASETS:
+        csv = path(name)
+        stat = os.stat(csv) if os.path.exists(csv) else None
+        digest.update(f"{csv} {stat.st_size} {stat.st_mtime_ns}".encode() if stat else f"{csv} missing".encode())
+    return digest.hexdigest()[:12]
+
+
+def memory_footprint():
+    """Bytes held by each dataset loaded so far."""
+    return {name: int(_load(name).memory_usage(deep=True).sum()) for name in DATASETS if name in load_seconds}
+
+
+def _is_mapped(values):
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def mapped_footprint():
+    """Bytes of each loaded dataset that are memory-mapped, and so shared with every other worker."""
+    footprint = {}
+    for name in DATASETS:
+        if name in load_seconds:
+            df = _load(name)
+            arrays = [df[col].cat.codes.to_numpy() if isinstance(df[col].dtype, pd.CategoricalDtype)
+                      else df[col].to_numpy() for col in df.columns]
+            footprint[name] = sum(values.nbytes for values in arrays if _is_mapped(values))
+    return footprint
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ['build']:
+        build()
+        print(f"Wrote {', '.join(parquet_path(name) for name in DATASETS)}")
+    for name in DATASETS:
+        get(name)
+    footprint, mapped = memory_footprint(), mapped_footprint()
+    for name in DATASETS:
+        print(f"{name:<14}{load_seconds[name] * 1000:>8.0f} ms{footprint[name] / 2 ** 20:>9.1f} MB"
+              f"{mapped[name] / 2 ** 20:>9.1f} MB mapped")
+    print(f"{'total':<14}{sum(load_seconds.values()) * 1000:>8.0f} ms{sum(footprint.values()) / 2 ** 20:>9.1f} MB"
+          f"{sum(mapped.values()) / 2 ** 20:>9.1f} MB mapped")
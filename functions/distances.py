@@ -0,0 +1,171 @@
+"""
+Vectorised distance calculations between arrays of (latitude, longitude) points, in km.
+
+Two methods are available:
+1. 'haversine' - great-circle distance on a sphere, cheapest to compute
+2. 'geodesic'  - distance on the WGS-84 ellipsoid (Vincenty's inverse formula), agrees with
+                 geopy.distance.geodesic to well under a millimetre, used for the model features
+
+Points can be given as a single (lat, lon) tuple, a list of tuples, an (n, 2) array
+or a DataFrame with 'latitude' and 'longitude' columns.
+"""
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Radius used by web mercator (EPSG:3857), in metres
+MERCATOR_RADIUS_M = 6378137.0
+
+# WGS-84 ellipsoid
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# Number of query rows handled at a time by nearest(), keeps the distance matrix small
+CHUNK_SIZE = 2048
+
+# The ellipsoid never moves a distance more than ~0.5% away from the spherical one, so only
+# points within this margin of the closest haversine distance can be the closest geodesic one
+SPHERE_TOLERANCE = 0.01
+
+
+def as_points(points, lat_col='latitude', lon_col='longitude'):
+    """Convert the supported point formats into an (n, 2) float array of [lat, lon] in degrees."""
+    if isinstance(points, pd.DataFrame):
+        arr = points[[lat_col, lon_col]].to_numpy(dtype=float)
+    elif isinstance(points, pd.Series):
+        arr = np.array([[points[lat_col], points[lon_col]]], dtype=float)
+    elif isinstance(points, dict):
+        arr = np.array([[points[lat_col], points[lon_col]]], dtype=float)
+    else:
+        arr = np.asarray(points, dtype=float)
+    return arr.reshape(-1, 2)
+
+
+def to_mercator(points):
+    """Project points to web mercator (EPSG:3857) x, y in metres, same numbers as geopandas' to_crs(epsg=3857)."""
+    points = as_points(points)
+    lat, lon = np.radians(points[:, 0]), np.radians(points[:, 1])
+    x = MERCATOR_RADIUS_M * lon
+    y = MERCATOR_RADIUS_M * np.log(np.tan(np.pi / 4 + lat / 2))
+    return np.column_stack([x, y])
+
+
+def mercator_scale(lat):
+    """Factor by which web mercator stretches true distances at a given latitude (degrees)."""
+    return 1 / np.cos(np.radians(lat))
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Element-wise great-circle distance, inputs in degrees and broadcastable."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    h = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def vincenty(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """Element-wise ellipsoidal distance on WGS-84, inputs in degrees and broadcastable."""
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*map(np.radians, (lat1, lon1, lat2, lon2)))
+
+    L = lon2 - lon1
+    U1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    U2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(U1), np.cos(U1)
+    sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+
+            # coincident points have sin_sigma == 0, their distance is 0 anyway
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # points on the equator have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+
+            C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * WGS84_F * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            if np.all(np.abs(lam - lam_prev) < tol):
+                break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+    ))
+    return WGS84_B * A * (sigma - delta_sigma)
+
+
+METHODS = {
+    'haversine': haversine,
+    'geodesic': vincenty,
+}
+
+
+def _method(method):
+    try:
+        return METHODS[method]
+    except KeyError:
+        raise ValueError(f"Unknown distance method '{method}', expected one of {list(METHODS)}")
+
+
+def distance_matrix(a, b, method='geodesic'):
+    """Full (len(a), len(b)) matrix of distances in km."""
+    a, b = as_points(a), as_points(b)
+    return _method(method)(a[:, None, 0], a[:, None, 1], b[None, :, 0], b[None, :, 1])
+
+
+def paired_distances(a, b, method='geodesic'):
+    """Distance in km between a[i] and b[i] for every i."""
+    a, b = as_points(a), as_points(b)
+    return _method(method)(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+
+
+def distance_to(a, point, method='geodesic'):
+    """Distance in km from every point in a to a single point."""
+    return distance_matrix(a, point, method)[:, 0]
+
+
+def nearest(a, b, method='geodesic', chunk_size=CHUNK_SIZE):
+    """
+    For every point in a, the distance to (km) and index of the closest point in b.
+    Rows of b with missing coordinates are never picked.
+    Returns (min_dist, argmin) arrays of length len(a).
+    """
+    a, b = as_points(a), as_points(b)
+    min_dist = np.full(len(a), np.inf)
+    argmin = np.full(len(a), -1, dtype=np.int64)
+    if len(b) == 0:
+        return min_dist, argmin
+
+    for start in range(0, len(a), chunk_size):
+        chunk = a[start:start + chunk_size]
+        dist = distance_matrix(chunk, b, 'haversine')
+        dist = np.where(np.isnan(dist), np.inf, dist)
+
+        if method != 'haversine':
+            # only evaluate the exact method on the few candidates that could be the closest
+            candidate = np.isfinite(dist) & (dist <= dist.min(axis=1, keepdims=True) * (1 + SPHERE_TOLERANCE))
+            rows, cols = np.nonzero(candidate)
+            dist = np.full(dist.shape, np.inf)
+            dist[rows, cols] = paired_distances(chunk[rows], b[cols], method)
+
+        idx = dist.argmin(axis=1)
+        argmin[start:start + chunk_size] = idx
+        min_dist[start:start + chunk_size] = dist[np.arange(len(idx)), idx]
+
+    argmin[np.isinf(min_dist)] = -1
+    return min_dist, argmin
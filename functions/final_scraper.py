@@ -99,12 +99,15 @@ def extract_sqft_number(area_str):
         return int(match.group(0).replace(",", ""))
     return None  # if not matched
 
-def scraper_guru(link):
+def scraper_guru(link, progress=None):
+    # progress(attempt, max_retries) is called before each attempt, for the page to show
     result = None
     current_year = datetime.now().year
     max_retries = 10
 
     for attempt in range(1, max_retries + 1):
+        if progress:
+            progress(attempt, max_retries)
         try:
             delay = random.uniform(2, 5)
             print(f"[INFO] Attempt {attempt} - sleeping {delay:.2f}s before request...")
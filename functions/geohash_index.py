@@ -0,0 +1,179 @@
+"""
+Geohash bucket index for nearest-point queries on any layer with a 'geohash' column
+(mrt_stations.csv, hdb_informations.csv, ...).
+
+Points are bucketed by their geohash cell at every precision up to MAX_PRECISION. A query looks
+at its own cell plus the 8 neighbouring cells, and stops as soon as the closest candidate is
+nearer than the edge of that 3x3 block, since nothing outside it can then be closer. If the
+block is empty or the bound fails, it retries one precision coarser, so results are always exact
+and the candidate set stays a handful of cells per query.
+"""
+
+import numpy as np
+
+from functions.distances import SPHERE_TOLERANCE, as_points, nearest, paired_distances
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+BASE32_VALUE = {char: value for value, char in enumerate(BASE32)}
+
+# Precision 7 cells are ~150m across, finer than any amenity layer needs
+MAX_PRECISION = 7
+
+# Shortest length of a degree of latitude (at the equator) in km, longitude is scaled by cos(lat)
+KM_PER_DEGREE = 110.574
+# Safety factor on the bound, covers the ellipsoid and rounding at cell edges
+BOUND_SAFETY = 0.99
+
+
+def cell_size(precision):
+    """(lat, lon) size of a geohash cell in degrees."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def cell_of(lat, lon, precision):
+    """Integer (row, column) of the geohash cell holding each point."""
+    dlat, dlon = cell_size(precision)
+    row = np.floor((np.asarray(lat, dtype=float) + 90) / dlat).astype(np.int64)
+    col = np.floor((np.asarray(lon, dtype=float) + 180) / dlon).astype(np.int64)
+    return row, col
+
+
+def decode_cell(geohash, precision):
+    """Integer (row, column) of a geohash string truncated to precision, same grid as cell_of."""
+    row = col = 0
+    is_lon = True
+    for char in geohash[:precision]:
+        value = BASE32_VALUE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if is_lon:
+                col = (col << 1) | bit
+            else:
+                row = (row << 1) | bit
+            is_lon = not is_lon
+    return row, col
+
+
+def encode(lat, lon, precision=12):
+    """Geohash string of a point."""
+    row, col = cell_of(lat, lon, precision)
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    lon_remaining, lat_remaining = lon_bits, lat_bits
+    chars = []
+    value, count, is_lon = 0, 0, True
+    for _ in range(bits):
+        if is_lon:
+            lon_remaining -= 1
+            bit = (int(col) >> lon_remaining) & 1
+        else:
+            lat_remaining -= 1
+            bit = (int(row) >> lat_remaining) & 1
+        value = (value << 1) | bit
+        count += 1
+        is_lon = not is_lon
+        if count == 5:
+            chars.append(BASE32[value])
+            value, count = 0, 0
+    return ''.join(chars)
+
+
+class GeohashIndex:
+    """Exact nearest-point lookups from geohash buckets with 8-neighbour expansion."""
+
+    def __init__(self, df, lat_col='latitude', lon_col='longitude', geohash_col='geohash',
+                 max_precision=MAX_PRECISION, method='geodesic'):
+        self.method = method
+        self.max_precision = max_precision
+        df = df.dropna(subset=[lat_col, lon_col])
+        self.points = as_points(df, lat_col, lon_col)
+        hashes = df[geohash_col].astype(str).to_numpy() if geohash_col in df else None
+
+        # buckets[precision][(row, col)] -> positions in self.points
+        self.buckets = {}
+        for precision in range(1, max_precision + 1):
+            if hashes is not None and all(len(h) >= precision for h in hashes):
+                cells = np.array([decode_cell(h, precision) for h in hashes], dtype=np.int64).reshape(-1, 2)
+            else:
+                cells = np.column_stack(cell_of(self.points[:, 0], self.points[:, 1], precision))
+            buckets = {}
+            for pos, cell in enumerate(map(tuple, cells)):
+                buckets.setdefault(cell, []).append(pos)
+            self.buckets[precision] = {cell: np.array(pos) for cell, pos in buckets.items()}
+
+    def _candidates(self, precision, row, col):
+        buckets = self.buckets[precision]
+        found = [buckets[(row + i, col + j)] for i in (-1, 0, 1) for j in (-1, 0, 1) if (row + i, col + j) in buckets]
+        return np.concatenate(found) if found else None
+
+    def _bound(self, points, precision, row, col):
+        """Distance in km from each point to the edge of the 3x3 block around its cell."""
+        dlat, dlon = cell_size(precision)
+        lat_lo, lat_hi = (row - 1) * dlat - 90, (row + 2) * dlat - 90
+        lon_lo, lon_hi = (col - 1) * dlon - 180, (col + 2) * dlon - 180
+        lat_margin = np.minimum(points[:, 0] - lat_lo, lat_hi - points[:, 0])
+        lon_margin = np.minimum(points[:, 1] - lon_lo, lon_hi - points[:, 1])
+        cos_lat = np.cos(np.radians(np.maximum(np.abs(lat_lo), np.abs(lat_hi))))
+        return BOUND_SAFETY * KM_PER_DEGREE * np.minimum(lat_margin, lon_margin * cos_lat)
+
+    def nearest_many(self, points):
+        """Closest indexed point for many points at once, as (distances in km, positions in the indexed frame)."""
+        points = as_points(points)
+        min_dist = np.full(len(points), np.inf)
+        argmin = np.full(len(points), -1, dtype=np.int64)
+        if len(self.points) == 0:
+            return min_dist, argmin
+
+        pending = np.arange(len(points))
+        for precision in range(self.max_precision, 0, -1):
+            if len(pending) == 0:
+                break
+            rows, cols = cell_of(points[pending, 0], points[pending, 1], precision)
+            cells, group, counts = np.unique(np.column_stack([rows, cols]), axis=0,
+                                             return_inverse=True, return_counts=True)
+            by_cell = np.split(pending[np.argsort(group.ravel(), kind='stable')], np.cumsum(counts)[:-1])
+
+            # pair every pending point with the candidates of its 3x3 block
+            pair_point, pair_cand = [], []
+            for (row, col), members in zip(cells, by_cell):
+                candidates = self._candidates(precision, row, col)
+                if candidates is not None:
+                    pair_point.append(np.repeat(members, len(candidates)))
+                    pair_cand.append(np.tile(candidates, len(members)))
+            if not pair_point:
+                continue
+
+            # score all pairs on the sphere first, only near-ties get the exact method
+            pair_point, pair_cand = np.concatenate(pair_point), np.concatenate(pair_cand)
+            dist = paired_distances(points[pair_point], self.points[pair_cand], 'haversine')
+            if self.method != 'haversine':
+                closest = np.full(len(points), np.inf)
+                np.minimum.at(closest, pair_point, dist)
+                keep = dist <= closest[pair_point] * (1 + SPHERE_TOLERANCE)
+                pair_point, pair_cand = pair_point[keep], pair_cand[keep]
+                dist = paired_distances(points[pair_point], self.points[pair_cand], self.method)
+
+            # keep the closest candidate per point
+            order = np.lexsort((dist, pair_point))
+            first = order[np.flatnonzero(np.diff(pair_point[order], prepend=-1))]
+            best_point, best_cand, best_dist = pair_point[first], pair_cand[first], dist[first]
+
+            # nothing outside the 3x3 block can beat a candidate closer than its edge
+            row, col = cell_of(points[best_point, 0], points[best_point, 1], precision)
+            done = best_dist <= self._bound(points[best_point], precision, row, col)
+            min_dist[best_point[done]] = best_dist[done]
+            argmin[best_point[done]] = best_cand[done]
+            pending = np.setdiff1d(pending, best_point[done])
+
+        # whatever is left is far from every cell, fall back to a full scan
+        if len(pending):
+            min_dist[pending], argmin[pending] = nearest(points[pending], self.points, self.method)
+        return min_dist, argmin
+
+    def nearest(self, point):
+        """Closest indexed point to a single point, as (distance in km, position in the indexed frame)."""
+        dist, idx = self.nearest_many(point)
+        return float(dist[0]), int(idx[0])
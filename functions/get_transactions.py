@@ -1,11 +1,14 @@
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
 from datetime import datetime, timedelta
 
-hdb_data = pd.read_csv("dataset/hdb_informations.csv")
-trans_data = pd.read_csv("dataset/hdb_final_dataset.csv")
-trans_data['date'] = pd.to_datetime(trans_data['month'])
+from functions import data_registry, postal_index
+from functions.block_neighbours import get_block_neighbours
+
+hdb_data = data_registry.get('blocks')
+trans_data = data_registry.get('transactions')
+
+# Precomputed 50 nearest / 1km neighbours of every block, rows line up with hdb_data
+block_neighbours = get_block_neighbours()
 
 # Flat type mapping (can be extended)
 flat_map = {
@@ -20,8 +23,8 @@ flat_map = {
 
 def get_transactions(postal_code, user_flat):
     # Validate postal code, if no match, hit error
-    filtered = hdb_data[hdb_data['postal_code'].astype(str) == str(postal_code)]
-    if filtered.empty:
+    coord_row = postal_index.block(postal_code, hdb_data)
+    if coord_row is None:
         raise ValueError(f"Postal code {postal_code} not found in HDB dataset.") #if you want to hit error
         #return pd.DataFrame(columns=['date', 'address', 'adjusted_resale_price'])  #if you want empty df
 
@@ -31,21 +34,13 @@ def get_transactions(postal_code, user_flat):
         raise ValueError(f"Unsupported or missing flat type '{user_flat}'") #if you want to hit error
         #return pd.DataFrame(columns=['date', 'address', 'adjusted_resale_price']) #if you want empty df
     
-    coord_row = filtered.iloc[0]
-    hdb_coords = (coord_row['latitude'], coord_row['longitude'])
-    hdb_point = gpd.GeoSeries([Point(hdb_coords[1], hdb_coords[0])], crs="EPSG:4326").to_crs(epsg=3857)
-    # Create GeoDataFrame with distances
-    gdf = gpd.GeoDataFrame(
-        hdb_data,
-        geometry=[Point(xy) for xy in zip(hdb_data['longitude'], hdb_data['latitude'])],
-        crs="EPSG:4326"
-    ).to_crs(epsg=3857)
-    gdf['distance'] = gdf.geometry.distance(hdb_point.iloc[0])
-    nearest_hdbs = gdf.nsmallest(50, 'distance')
-    hdb_1km = gdf[gdf['distance'] <= 1000]
+    block_row = block_neighbours.row_of(coord_row['postal_code'])
+    nearest_ids, nearest_dist = block_neighbours.nearest(block_row)
+    nearest_hdbs = hdb_data.iloc[nearest_ids]
+    hdb_1km = hdb_data.iloc[block_neighbours.within_radius(block_row)]
     # Filter transactions
-    df_nearby = trans_data[trans_data['postal_code'].astype(str).isin(nearest_hdbs['postal_code'].astype(str))]
-    trans_1km = trans_data[trans_data['postal_code'].astype(str).isin(hdb_1km['postal_code'].astype(str))]
+    df_nearby = trans_data.iloc[postal_index.transaction_rows(nearest_hdbs['postal_code'])]
+    trans_1km = trans_data.iloc[postal_index.transaction_rows(hdb_1km['postal_code'])]
     df_same_type = df_nearby[df_nearby[flat_key] == 1]
     same_type_1km = trans_1km[trans_1km[flat_key]==1]
     one_year_ago = datetime(2025, 1, 1) - timedelta(days=365)
@@ -56,15 +51,16 @@ def get_transactions(postal_code, user_flat):
 
     df_recent_sorted = df_recent.sort_values(by='date', ascending=False)
     df_deduped = df_recent_sorted.drop_duplicates(subset='address', keep='first')
-    df_with_dist = pd.merge(df_deduped, gdf[['address', 'distance']], on='address', how='left')
+    # comparables all come from the nearest blocks, whose distances are in the graph
+    block_dist = pd.DataFrame({'address': nearest_hdbs['address'].to_numpy(), 'distance': nearest_dist})
+    df_with_dist = pd.merge(df_deduped, block_dist, on='address', how='left')
     top3 = df_with_dist.nsmallest(3, 'distance')
 
     return top3[['month', 'address', 'storey_range', 'adjusted_resale_price']], recent_1km_year, top3
 
 def get_block_transactions(postal_code, user_flat):
     # Validate postal code, if no match, hit error
-    filtered = hdb_data[hdb_data['postal_code'].astype(str) == str(postal_code)]
-    if filtered.empty:
+    if postal_index.block_row(postal_code) is None:
         raise ValueError(f"Postal code {postal_code} not found in HDB dataset.") #if you want to hit error
         #return pd.DataFrame(columns=['date', 'address', 'adjusted_resale_price'])  #if you want empty df
     # Validate flat type, if no match, hit error
@@ -74,7 +70,7 @@ def get_block_transactions(postal_code, user_flat):
         #return pd.DataFrame(columns=['date', 'address', 'adjusted_resale_price']) #if you want empty df
 
     # Filter transactions
-    block_transaction = trans_data[trans_data['postal_code'].astype(str) == postal_code]
+    block_transaction = postal_index.block_transactions(postal_code, trans_data)
     block_same_type = block_transaction[block_transaction[flat_key] == 1]
     one_year_ago = datetime(2025, 1, 1) - timedelta(days=365)
     two_year_ago = datetime(2025, 1, 1) - timedelta(days=2*365)
@@ -1,10 +1,11 @@
-from geopy.distance import geodesic
-import pandas as pd
+from functions import data_registry, postal_index
+from functions.amenity_index import get_amenity_index
+from functions.block_amenities import get_block_amenities
+from functions.distances import distance_to
 
-hdb_data = pd.read_csv("dataset/hdb_informations.csv")
-schools = pd.read_csv("dataset/all_primary_schools.csv")
-mrt_stations = pd.read_csv("dataset/mrt_stations.csv")
-hawkercentres = pd.read_csv("dataset/hawkercentercoord.csv")
+hdb_data = data_registry.get('blocks')
+amenity_index = get_amenity_index()
+block_amenities = get_block_amenities()
 
 ####################### FIXED VARIABLES ############################
 cbd_coords = (1.287953, 103.851784)
@@ -19,28 +20,25 @@ options = ['flat_type_1 ROOM', 'flat_type_2 ROOM',
 def get_all_nearest_amenities(coord_row):
     hdb_coords = (coord_row['latitude'], coord_row['longitude'])
 
+    # Known blocks are a lookup in the precomputed table, anything else goes to the amenity index
+    block = block_amenities.get(coord_row['postal_code']) if 'postal_code' in coord_row else None
+
     # Find nearest amenity and return name, distance, and coordinates
-    def nearest_amenity(amenity_df, name_col, lat_col='latitude', lon_col='longitude'):
-        min_dist = float('inf')
-        nearest_name = None
-        nearest_coords = (None, None)
-        for row in amenity_df.itertuples(index=False):
-            try:
-                coords = (getattr(row, lat_col), getattr(row, lon_col))
-                dist = geodesic(hdb_coords, coords).km
-                if dist < min_dist:
-                    min_dist = dist
-                    nearest_name = getattr(row, name_col)
-                    nearest_coords = coords
-            except:
-                continue
-        return nearest_name, round(min_dist, 2), nearest_coords
-
-    nearest_school, school_dist, school_coords = nearest_amenity(schools, 'school')
-    nearest_mrt, mrt_dist, mrt_coords = nearest_amenity(mrt_stations, 'station_name')
-    nearest_food, food_dist, food_coords = nearest_amenity(hawkercentres, 'hc_name')
-
-    cbd_dist = round(geodesic(hdb_coords, cbd_coords).km, 2)
+    def nearest_amenity(layer):
+        if block is not None:
+            name, dist, coords = block[layer]
+        else:
+            name, dist, coords = amenity_index.nearest_with_name(layer, hdb_coords)
+        return name, round(dist, 2), coords
+
+    nearest_school, school_dist, school_coords = nearest_amenity('school')
+    nearest_mrt, mrt_dist, mrt_coords = nearest_amenity('mrt')
+    nearest_food, food_dist, food_coords = nearest_amenity('hawker')
+
+    if block is not None:
+        cbd_dist = round(block['cbd_dist'], 2)
+    else:
+        cbd_dist = round(float(distance_to([hdb_coords], cbd_coords)[0]), 2)
 
     return {
         'nearest_school': {
@@ -80,8 +78,8 @@ def check_flat(coord_row, user_flat):
 
 def get_information(postal_code, flat_type, area, floor, remaining_lease):
     #get the postal code, and associated row
-    coord_row = hdb_data[hdb_data['postal_code'] == postal_code].iloc[0]
-    if coord_row.empty:
+    coord_row = postal_index.block(postal_code, hdb_data)
+    if coord_row is None:
         raise ValueError(f"Postal code {postal_code} not found in coordinate dataset.")
     
     else:
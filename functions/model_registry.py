@@ -0,0 +1,143 @@
+"""
+Versioned models for the output page. Each version is a directory of the registry (MODEL_REGISTRY,
+models/registry by default), never changed once published:
+
+    models/registry/
+        20261018-151200/xgb_model.bin
+        20261018-151200/meta.json    # features, training window and q of the model, publish time
+        SERVING                      # the version the app serves and every one served before it
+
+From the repo root:
+
+    python -m functions.model_registry publish models/xgb_model.bin models/q_value.txt 2017-01 2025-03
+    python -m functions.model_registry activate 20261018-151200
+    python -m functions.model_registry rollback     # back to the version served before
+    python -m functions.model_registry list
+
+publish() writes a version into a temporary directory and renames it into place, activate() and
+rollback() replace SERVING with one os.replace(), so a worker never reads half a model, and the
+served version and its history never disagree. Running workers switch to the new version by
+themselves, see predictor.get_predictor(). Without a SERVING, the app serves models/xgb_model.bin
+and q_value.txt as before.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from models.model_tuning import exog
+
+REGISTRY_DIR = os.environ.get("MODEL_REGISTRY", "models/registry")
+TMP_PREFIX = ".tmp-"  # files and versions being written, never read
+SERVING_PATH = os.path.join(REGISTRY_DIR, "SERVING")
+
+
+def version_dir(version):
+    return os.path.join(REGISTRY_DIR, version)
+
+
+def model_path(version):
+    return os.path.join(version_dir(version), "xgb_model.bin")
+
+
+def metadata(version):
+    """features, training_window, q and published of a version."""
+    with open(os.path.join(version_dir(version), "meta.json")) as f:
+        return json.load(f)
+
+
+def versions():
+    """Every published version, oldest first."""
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+    return sorted(name for name in os.listdir(REGISTRY_DIR) if not name.startswith(TMP_PREFIX)
+                  and os.path.exists(os.path.join(version_dir(name), "meta.json")))
+
+
+def history():
+    """Every version served so far, oldest first, the last one the version the app serves."""
+    try:
+        with open(SERVING_PATH) as f:
+            return json.load(f)['history']
+    except FileNotFoundError:
+        return []
+
+
+def current():
+    """The version the app serves, or None without a registry."""
+    served = history()
+    return served[-1] if served else None
+
+
+def _replace(path, text):
+    """Write a file of the registry in one step, readers see either the old or the new content."""
+    fd, tmp = tempfile.mkstemp(dir=REGISTRY_DIR, prefix=TMP_PREFIX)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def publish(booster_path, q, training_window, features=exog, version=None):
+    """Add a model to the registry, without serving it yet. Returns its version."""
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    if os.path.exists(version_dir(version)):
+        raise ValueError(f"Version {version} is already published.")
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=REGISTRY_DIR, prefix=TMP_PREFIX)
+    try:
+        shutil.copyfile(booster_path, os.path.join(tmp, "xgb_model.bin"))
+        meta = {'features': list(features), 'training_window': list(training_window), 'q': float(q),
+                'published': time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        os.rename(tmp, version_dir(version))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return version
+
+
+def activate(version):
+    """Serve a published version from now on."""
+    if version not in versions():
+        raise ValueError(f"Version {version} is not published.")
+    served = history()
+    if not served or served[-1] != version:
+        _replace(SERVING_PATH, json.dumps({'history': served + [version]}))
+
+
+def rollback():
+    """Serve the version served before the current one again. Returns it."""
+    served = history()
+    if len(served) < 2:
+        raise ValueError("No earlier version to roll back to.")
+    _replace(SERVING_PATH, json.dumps({'history': served[:-1]}))
+    return served[-2]
+
+
+if __name__ == "__main__":
+    command, args = sys.argv[1] if sys.argv[1:] else "list", sys.argv[2:]
+    if command == "publish":
+        booster_path, q_path, start, end = args
+        with open(q_path) as f:
+            version = publish(booster_path, float(f.read()), (start, end))
+        activate(version)
+        print(f"Published and serving {version}")
+    elif command == "activate":
+        activate(args[0])
+        print(f"Serving {args[0]}")
+    elif command == "rollback":
+        print(f"Serving {rollback()}")
+    else:
+        serving = current()
+        for version in versions():
+            meta = metadata(version)
+            print(f"{'*' if version == serving else ' '} {version}  trained on {' to '.join(meta['training_window'])}"
+                  f"  q={meta['q']:,.0f}  published {meta['published']}")
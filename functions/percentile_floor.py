@@ -1,5 +1,3 @@
-import pandas as pd
-hdb_df = pd.read_csv("dataset/hdb_informations.csv")
 floor_percentiles = {
     'Low': 0.25,
     'Mid': 0.5,
@@ -0,0 +1,63 @@
+"""
+Postal code lookups on the block and transaction datasets without scanning a column.
+
+Postal codes arrive as ints (560174), strings ('560174', '050004') or floats from the inputs and
+datasets, so they are first normalised with postal_key() to a 6 digit string. Two hash indexes
+are built once per process from the data registry:
+1. postal key -> row of the block in the blocks dataset
+2. postal key -> (start, stop) rows of its transactions, which the registry keeps sorted by
+   postal code, so a block's transaction history is a contiguous slice
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from functions import data_registry
+
+
+def postal_key(postal_code):
+    """6 digit string form of a postal code, whether it comes in as 50004, '50004' or '050004'."""
+    return str(postal_code).strip().split('.')[0].zfill(6)
+
+
+@lru_cache(maxsize=None)
+def _block_rows():
+    postal = data_registry.get('blocks')['postal_code'].to_numpy()
+    return {postal_key(code): row for row, code in enumerate(postal)}
+
+
+@lru_cache(maxsize=None)
+def _transaction_ranges():
+    postal = data_registry.get('transactions')['postal_code'].to_numpy()
+    codes, starts = np.unique(postal, return_index=True)
+    stops = np.append(starts[1:], len(postal))
+    return {postal_key(code): (start, stop) for code, start, stop in zip(codes, starts, stops)}
+
+
+def block_row(postal_code):
+    """Row of a block in the blocks dataset, or None for an unknown postal code."""
+    return _block_rows().get(postal_key(postal_code))
+
+
+def block(postal_code, blocks=None):
+    """The block's row as a Series, or None for an unknown postal code."""
+    row = block_row(postal_code)
+    if row is None:
+        return None
+    return (data_registry.get('blocks') if blocks is None else blocks).iloc[row]
+
+
+def transaction_rows(postal_codes):
+    """Rows of every transaction at any of the postal codes, in table order."""
+    ranges = _transaction_ranges()
+    found = [ranges[key] for key in map(postal_key, postal_codes) if key in ranges]
+    if not found:
+        return np.empty(0, dtype=np.int64)
+    return np.sort(np.concatenate([np.arange(start, stop) for start, stop in found]))
+
+
+def block_transactions(postal_code, transactions=None):
+    """All transactions of one block, a contiguous slice of the transaction table."""
+    start, stop = _transaction_ranges().get(postal_key(postal_code), (0, 0))
+    return (data_registry.get('transactions') if transactions is None else transactions).iloc[start:stop]
@@ -0,0 +1,233 @@
+"""
+Single-flat valuation for the output page, the booster's in-place prediction on a raw float32 row.
+
+    predictor = get_predictor()
+    y_pred, y_lower, y_upper = predictor.predict(input_vector[0])   # get_information()'s features
+
+conformal_predict() builds a one-row DataFrame and a DMatrix, and validates the column names,
+for every flat it scores. Here the feature order is fixed once from the model's features, each thread
+fills a preallocated 1 x 13 float32 row, and the booster scores it in place, which xgboost
+allows from any number of threads at once. Predictions are the same as conformal_predict()'s.
+
+Many users value the same blocks with the same flat type, floor and lease, so predictions are
+cached (prediction_cache, least recently used evicted first) by the model version and the
+float32 row the booster would score: the canonical form of a flat's features, in which 60 and
+60.0, or a distance and its float32 rounding, are one key, so entries of another model are
+never read and simply age out.
+
+get_predictor() serves the current version of the model registry (see model_registry), else
+models/xgb_model.bin and q_value.txt, versioned by their size and modification time. It looks
+again every CHECK_INTERVAL seconds, or at the next call after a SIGHUP, and switches to a new
+version once it is loaded: requests keep being served by the previous model meanwhile, and if
+the new one fails to load the previous one stays. The previous model is kept loaded, with its
+cached predictions, so a rollback to it is immediate.
+
+Every call's latency and the cache's hit rate are recorded, see metrics(), or from the repo root:
+
+    python -m functions.predictor    # latency of the fast path and of conformal_predict
+"""
+
+import hashlib
+import os
+import signal
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import xgboost as xgb
+
+from functions import model_registry
+from functions.result_cache import LRUCache
+from models.model_tuning import exog
+
+MODEL_PATH = "models/xgb_model.bin"
+Q_PATH = "models/q_value.txt"
+CHECK_INTERVAL = 1.0  # seconds between two looks at the served version
+
+# (model version, float32 row) -> (prediction, lower, upper), shared by every thread of the process
+prediction_cache = LRUCache(max_entries=16_384)
+
+
+class LatencyStats:
+    """Thread-safe count, mean and percentiles of the last `window` durations."""
+
+    def __init__(self, window=10_000):
+        self.recent = deque(maxlen=window)
+        self.calls = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.recent.append(seconds)
+            self.calls += 1
+            self.total += seconds
+
+    def summary(self):
+        """Microseconds: mean of all calls, p50 / p99 / max of the recent ones."""
+        with self.lock:
+            recent = np.array(self.recent)
+            calls, total = self.calls, self.total
+        if not calls:
+            return {'calls': 0}
+        p50, p99 = np.percentile(recent, [50, 99]) * 1e6
+        return {'calls': calls, 'mean_us': round(total / calls * 1e6, 1), 'p50_us': round(float(p50), 1),
+                'p99_us': round(float(p99), 1), 'max_us': round(float(recent.max()) * 1e6, 1)}
+
+
+class Predictor:
+    """Point prediction and conformal bounds of one flat at a time, safe to share between threads."""
+
+    def __init__(self, booster, q, version=None, cache=None, features=exog):
+        self.booster = booster
+        self.q = q
+        self.version = version
+        self.cache = cache
+        self.features = list(features)
+        self.local = threading.local()
+        self.latency = LatencyStats()
+
+    def _row(self):
+        row = getattr(self.local, 'row', None)
+        if row is None:
+            row = self.local.row = np.empty((1, len(self.features)), dtype=np.float32)
+        return row
+
+    def predict(self, features):
+        """
+        (prediction, lower, upper) of one flat, as floats. features is a dict by feature name,
+        a missing feature is NaN, or a sequence in exog order.
+        """
+        start = time.perf_counter()
+        row = self._row()
+        if isinstance(features, dict):
+            for i, name in enumerate(self.features):
+                value = features.get(name)
+                row[0, i] = np.nan if value is None else value
+        else:
+            row[0] = features
+        key = (self.version, row.tobytes())
+        result = self.cache.get(key) if self.cache is not None else None
+        if result is None:
+            y_pred = self.booster.inplace_predict(row, validate_features=False)
+            # bounds in float32, as conformal_predict() has them
+            result = float(y_pred[0]), float((y_pred - self.q)[0]), float((y_pred + self.q)[0])
+            if self.cache is not None:
+                self.cache.put(key, result)
+        self.latency.record(time.perf_counter() - start)
+        return result
+
+    def metrics(self):
+        """Latency of the calls, and hits, misses and hit rate of the cache."""
+        metrics = {'version': self.version, **self.latency.summary()}
+        if self.cache is not None:
+            stats = self.cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            metrics.update(cache_entries=stats['entries'], cache_hits=stats['hits'], cache_misses=stats['misses'],
+                           cache_hit_rate=round(stats['hits'] / lookups, 3) if lookups else None)
+        return metrics
+
+
+def load_booster(path=MODEL_PATH):
+    booster = xgb.Booster()
+    booster.load_model(path)
+    return booster
+
+
+def load_q(path=Q_PATH):
+    with open(path, "r") as f:
+        return float(f.read())
+
+
+def model_version(paths=(MODEL_PATH, Q_PATH)):
+    """Short id of the model files, from their size and modification time."""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path} {stat.st_size} {stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+
+def served_version():
+    """Version of the model to serve, the registry's current one or the files' model_version()."""
+    return model_registry.current() or model_version()
+
+
+def load_predictor(version):
+    """Predictor of a registry version, or of the files in models/ for their model_version()."""
+    if version in model_registry.versions():
+        meta = model_registry.metadata(version)
+        return Predictor(load_booster(model_registry.model_path(version)), meta['q'], version=version,
+                         cache=prediction_cache, features=meta['features'])
+    if version != model_version():
+        raise ValueError(f"Model {version} is neither published in {model_registry.REGISTRY_DIR} nor in models/.")
+    return Predictor(load_booster(), load_q(), version=version, cache=prediction_cache)
+
+
+_predictor = None  # the model serving
+_previous = None  # the one served before it, kept for a rollback
+_failed = None  # version that didn't load, not tried again
+_checked = 0.0
+_lock = threading.Lock()
+_reload = threading.Event()
+
+
+def _switch(version):
+    global _predictor, _previous, _failed
+    if _predictor is not None and version in (_predictor.version, _failed):
+        return
+    if _previous is not None and _previous.version == version:
+        _predictor, _previous = _previous, _predictor
+        return
+    try:
+        predictor = load_predictor(version)
+    except Exception as e:
+        if _predictor is None:
+            raise
+        _failed = version
+        print(f"[WARNING] Model {version} could not be loaded, still serving {_predictor.version}: "
+              f"{str(e).splitlines()[0]}")
+        return
+    _predictor, _previous, _failed = predictor, _predictor, None
+
+
+def get_predictor():
+    """The model to serve, switched to a new version within CHECK_INTERVAL seconds of its release."""
+    global _checked
+    if _predictor is not None and time.monotonic() - _checked < CHECK_INTERVAL and not _reload.is_set():
+        return _predictor
+    # only one thread looks and loads, the others keep the model serving meanwhile
+    if not _lock.acquire(blocking=_predictor is None):
+        return _predictor
+    try:
+        _reload.clear()
+        _switch(served_version())
+        _checked = time.monotonic()
+    finally:
+        _lock.release()
+    return _predictor
+
+
+def install_reload_signal(signum=getattr(signal, 'SIGHUP', None)):
+    """Look for a new model at the next call after `kill -HUP <pid>`, from the main thread only."""
+    if signum is not None and threading.current_thread() is threading.main_thread():
+        signal.signal(signum, lambda *_: _reload.set())
+
+
+if __name__ == "__main__":
+    from functions import data_registry
+    from models.model_tuning import conformal_predict
+
+    predictor = get_predictor()
+    rows = data_registry.get('transactions')[exog].head(1000).to_dict('records')
+    start = time.perf_counter()
+    slow = [conformal_predict(predictor.booster, row, predictor.q)[0][0] for row in rows]
+    slow_us = (time.perf_counter() - start) / len(rows) * 1e6
+    fast = [predictor.predict(row)[0] for row in rows]
+    print(f"conformal_predict {slow_us:>8.1f} us per flat")
+    print(f"Predictor.predict {predictor.metrics()}")
+    print(f"largest difference {np.abs(np.array(fast) - np.array(slow)).max()}")
+    for row in rows:
+        predictor.predict(row)
+    print(f"same flats again  {predictor.metrics()}")
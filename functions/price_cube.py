@@ -0,0 +1,210 @@
+"""
+Pre-sorted index of resale prices, for the town comparison on the general output page.
+
+For a town and flat type, the page shows the mean, count, highest and lowest adjusted resale
+price per quarter over QUARTERS, of one floor category, filtered by three thresholds: a
+remaining lease of at least L years, and at most M / S km to the nearest MRT / primary school.
+Only the cells that have sales are stored: the sales of every (town, flat type, floor category,
+quarter) are one run of the index, sorted by remaining lease from the top, each with
+
+    whole years of lease, MRT distance bucket, school distance bucket, row of the transaction
+
+so the sales meeting a lease threshold are a prefix of the run, found by binary search, and
+only that prefix is compared to the distance thresholds. The distance buckets are on the 0.1 km
+grid of the page's sliders, up to 2.5 km, plus one bucket for anything further; the lease slider
+moves in whole years, and a sale has at least L years left exactly when its whole years do. The
+index takes 8 bytes per sale whatever the filters, and a query reads a few runs of it. Queries
+it has no answer for (a distance off the slider grid, a lease that isn't whole years or no floor
+category) are answered from the transactions instead.
+
+Built offline, from the repo root, into dataset/build/price_cube.arrays/:
+
+    python -m functions.price_cube
+
+which every worker memory-maps, a query only touches the few pages of its runs. If that directory
+is missing or out of date, every query is answered from the transactions until it is rebuilt.
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from functions import data_registry
+from functions.artifacts import artifact_path, array_dir_index, is_stale, map_array_dir, save_array_dir
+from functions.transaction_partitions import TransactionPartitions
+
+CUBE_PATH = artifact_path("price_cube", 'arrays')
+DATASET = 'transactions_by_town'
+
+QUARTERS = ['Q2 2024', 'Q3 2024', 'Q4 2024', 'Q1 2025']  # Apr 2024 to Mar 2025, as on the page
+DIST_EDGES = np.round(np.arange(0, 26) * 0.1, 1)  # 0.0, 0.1, ... 2.5 km
+FLOORS = data_registry.FLOOR_CATEGORIES
+NO_ROW = -1
+NO_LEASE = -1  # whole years of a sale without a remaining lease, below any threshold
+STATS = ['units_sold', 'total', 'max_price', 'max_row', 'min_price', 'min_row']
+
+
+def _bucket(dist):
+    """Bucket k of each distance on the grid, DIST_EDGES[k - 1] < dist <= DIST_EDGES[k]."""
+    return np.searchsorted(DIST_EDGES, dist, side='left')
+
+
+def _grid_index(max_dist):
+    """Index of a distance threshold on the grid, or None if it is not on it."""
+    k = int(np.argmin(np.abs(DIST_EDGES - max_dist)))
+    return k if np.isclose(DIST_EDGES[k], max_dist) else None
+
+
+def _first_best(price, rows, highest):
+    """Position of the highest (or lowest) price, the first row winning a tie."""
+    return np.lexsort((rows, -price if highest else price))[0]
+
+
+def _transactions():
+    """The transactions the page shows (of blocks with a known max floor level) and their rows."""
+    df = data_registry.get(DATASET)
+    return df, np.flatnonzero(df['max_floor_lvl'].notna().to_numpy())
+
+
+def _run(g, floor, quarter):
+    """Run of the index of group g's sales on one floor category in one quarter."""
+    return (g * len(FLOORS) + floor) * len(QUARTERS) + quarter
+
+
+def build_cube():
+    """Index of the sales of every (town, flat type), as a dict of flat numpy arrays with CSR-style offsets."""
+    df, rows = _transactions()
+    df = df.iloc[rows]
+    quarter = pd.Categorical(df['quarter'], categories=QUARTERS).codes
+    keep = (quarter >= 0) & df['floor_category'].notna().to_numpy()
+    keep &= df['town'].notna().to_numpy() & df['flat_type'].notna().to_numpy()
+    df, rows, quarter = df[keep], rows[keep], quarter[keep]
+
+    group, keys = pd.MultiIndex.from_arrays([df['town'].astype(str), df['flat_type'].astype(str)]).factorize(sort=True)
+    lease = df['remaining_lease'].to_numpy(dtype=float)
+    lease = np.where(np.isnan(lease), NO_LEASE, np.floor(lease)).astype(np.int16)
+    run = _run(group, df['floor_category'].cat.codes.to_numpy(), quarter)
+
+    # by run, then from the longest lease down, then in table order
+    order = np.lexsort((rows, -lease, run))
+    runs = len(keys) * len(FLOORS) * len(QUARTERS)
+    return {
+        'town': keys.get_level_values(0).to_numpy(dtype=str),
+        'flat_type': keys.get_level_values(1).to_numpy(dtype=str),
+        'quarters': np.array(QUARTERS, dtype=str),
+        'run_indptr': np.concatenate([[0], np.cumsum(np.bincount(run, minlength=runs))]).astype(np.int64),
+        'lease': lease[order],
+        'mrt': _bucket(df['min_dist_mrt'].to_numpy(dtype=float))[order].astype(np.uint8),
+        'sch': _bucket(df['min_dist_sch'].to_numpy(dtype=float))[order].astype(np.uint8),
+        'row': rows[order].astype(np.int32),
+    }
+
+
+class PriceCube:
+    """Quarterly price aggregates of a town and flat type under the page's filters."""
+
+    def __init__(self, cube=None):
+        self.cube = cube
+        self.groups = {} if cube is None else {key: g for g, key in enumerate(zip(cube['town'], cube['flat_type']))}
+        self.quarters = QUARTERS if cube is None else list(cube['quarters'])
+        self.transactions, rows = _transactions()
+        self.partitions = TransactionPartitions(self.transactions.iloc[rows])
+        self.rows = rows
+        self.prices = self.transactions['adjusted_resale_price'].to_numpy(dtype=float)
+
+    def query(self, town, flat_type, floor_level=None, min_lease=None, max_dist_mrt=None, max_dist_sch=None):
+        """
+        Units sold, total, highest and lowest price (with the row of that sale, see transaction())
+        per quarter of QUARTERS, as a DataFrame indexed by quarter. Quarters without sales have
+        0 units sold. Filters that are None or 0 are not applied, as on the page.
+        """
+        mrt, sch = (_grid_index(dist) if dist else None for dist in (max_dist_mrt, max_dist_sch))
+        if (self.cube is None or not floor_level or (min_lease and min_lease != int(min_lease))
+                or (max_dist_mrt and mrt is None) or (max_dist_sch and sch is None)):
+            return self._from_rows(town, flat_type, floor_level, min_lease, max_dist_mrt, max_dist_sch)
+
+        stats = [self._combine(0)] * len(self.quarters)
+        g = self.groups.get((town, flat_type))
+        if g is not None:
+            indptr = self.cube['run_indptr']
+            for q in range(len(self.quarters)):
+                run = _run(g, FLOORS.index(floor_level), q)
+                start, stop = indptr[run], indptr[run + 1]
+                if min_lease:
+                    # leases are sorted from the top, the sales with at least L years are a prefix
+                    stop = start + np.searchsorted(-self.cube['lease'][start:stop], -int(min_lease), side='right')
+                keep = np.ones(stop - start, dtype=bool)
+                if mrt is not None:
+                    keep &= self.cube['mrt'][start:stop] <= mrt
+                if sch is not None:
+                    keep &= self.cube['sch'][start:stop] <= sch
+                # in table order, so the total adds up as it does from the transactions
+                rows = np.sort(self.cube['row'][start:stop][keep])
+                stats[q] = self._combine(len(rows), self.prices[rows].sum(), rows, rows)
+        return pd.DataFrame(stats, columns=STATS, index=pd.Index(self.quarters, name='quarter'))
+
+    def _combine(self, units, total=0.0, max_rows=(), min_rows=()):
+        """One row of query(), the highest and lowest sale picked among the candidate rows."""
+        if not units:
+            return [0, 0.0, np.nan, NO_ROW, np.nan, NO_ROW]
+        max_rows, min_rows = np.asarray(max_rows), np.asarray(min_rows)
+        max_row = max_rows[_first_best(self.prices[max_rows], max_rows, highest=True)]
+        min_row = min_rows[_first_best(self.prices[min_rows], min_rows, highest=False)]
+        return [int(units), float(total), self.prices[max_row], int(max_row), self.prices[min_row], int(min_row)]
+
+    def _from_rows(self, town, flat_type, floor_level, min_lease, max_dist_mrt, max_dist_sch):
+        """query() computed from the transactions, without the cube or for filters it can't answer."""
+        window = self.partitions.rows(town, flat_type)
+        df = self.partitions.df.iloc[window]
+        keep = df['quarter'].isin(self.quarters).to_numpy()
+        if floor_level:
+            keep &= (df['floor_category'] == floor_level).to_numpy()
+        if min_lease:
+            keep &= (df['remaining_lease'] >= min_lease).to_numpy()
+        if max_dist_mrt:
+            keep &= (df['min_dist_mrt'] <= max_dist_mrt).to_numpy()
+        if max_dist_sch:
+            keep &= (df['min_dist_sch'] <= max_dist_sch).to_numpy()
+        quarter, rows = df['quarter'].to_numpy(dtype=object)[keep], self.rows[window][keep]
+
+        stats = []
+        for label in self.quarters:
+            in_quarter = rows[quarter == label]
+            stats.append(self._combine(len(in_quarter), self.prices[in_quarter].sum(), in_quarter, in_quarter))
+        return pd.DataFrame(stats, columns=STATS, index=pd.Index(self.quarters, name='quarter'))
+
+    def overall(self, stats):
+        """A query() result summed over its quarters, as one row."""
+        sold = stats[stats['units_sold'] > 0]
+        return pd.Series(self._combine(sold['units_sold'].sum(), sold['total'].sum(), sold['max_row'].to_numpy(),
+                                       sold['min_row'].to_numpy()), index=STATS)
+
+    def transaction(self, row):
+        """A transaction by the row query() returned for it."""
+        return self.transactions.iloc[row]
+
+
+@lru_cache(maxsize=None)
+def _price_cube(path, index_mtime):
+    if path is None:
+        print(f"[WARNING] {CUBE_PATH} is missing or out of date, town comparisons are computed from the "
+              f"transactions until `python -m functions.price_cube` is run")
+        return PriceCube()
+    return PriceCube(map_array_dir(path))
+
+
+def get_price_cube(path=CUBE_PATH):
+    """The app-wide cube, mapped from the build artifact, or answering from the transactions while it is out of date."""
+    index = array_dir_index(path)
+    if is_stale(index, data_registry.sources(DATASET)):
+        return _price_cube(None, None)
+    return _price_cube(path, os.path.getmtime(index))
+
+
+if __name__ == "__main__":
+    cube = build_cube()
+    save_array_dir(CUBE_PATH, cube)
+    print(f"Wrote {len(cube['town'])} towns and flat types, {len(cube['row'])} sales "
+          f"({sum(values.nbytes for values in cube.values()) / 2 ** 20:.1f} MB) to {CUBE_PATH}")
@@ -0,0 +1,267 @@
+"""
+Precomputed valuations of every block, flat type and floor band, for the output page and for
+block-level price maps, without running the model at request time.
+
+For each block and each flat type it has, the surface holds the model's prediction over
+
+    floor band x floor area x remaining lease
+
+The floor bands are those of the PropertyGuru form (Ground, Low, Mid, High, Penthouse), each at
+the block's storey get_floor_est() gives it. The area axis of a flat type is every sqm over the
+areas it mostly sells at (5th to 95th percentile of its transactions), the lease axis every year
+from 40 to 99. A valuation on a band's storey is interpolated bilinearly in area and lease
+between the four grid points around it; the conformal bounds are the prediction -/+ q as usual.
+The forms only take whole sqm and years, which are grid points, where the surface is exactly the
+model's prediction. A coarser grid would be smaller but the trees' price steps don't interpolate:
+on a 5 sqm x 5 year grid, 1 valuation in 10 is more than 8% off. Anything else (another storey,
+an area or lease off the grid, a block or flat type the surface doesn't have) is predicted live,
+see predict().
+
+Built offline by one process per core, from the repo root, into dataset/build/price_surface.arrays/:
+
+    python -m functions.price_surface
+
+which every worker memory-maps. Unlike the other artifacts it is not rebuilt in memory: if the
+directory is missing, older than the datasets or built with another model than the one served
+(see predictor.get_predictor()), every valuation is predicted live until it is rebuilt.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from functions import data_registry
+from functions.artifacts import artifact_path, array_dir_index, is_stale, map_array_dir, save_array_dir
+from functions.block_amenities import SOURCES, get_block_amenities
+from functions.percentile_floor import get_floor_est
+from functions.postal_index import postal_key
+from functions.predictor import get_predictor
+from models.model_tuning import exog
+
+SURFACE_PATH = artifact_path("price_surface", 'arrays')
+
+FLOOR_BANDS = ['Ground', 'Low', 'Mid', 'High', 'Penthouse']
+FLAT_TYPES = [name.replace('flat_type_', '') for name in exog if name.startswith('flat_type_')]
+LEASES = np.arange(40, 100, dtype=float)
+AREA_STEP = 1
+GROUPS_PER_TASK = 256
+
+_booster = None
+_features = None
+
+
+def _area_axis(areas):
+    """Every AREA_STEP sqm over the 5th to 95th percentile of a flat type's floor areas."""
+    low, high = np.percentile(areas, [5, 95])
+    low, high = np.floor(low / AREA_STEP) * AREA_STEP, np.ceil(high / AREA_STEP) * AREA_STEP
+    return np.arange(low, max(high, low + AREA_STEP) + 1, AREA_STEP, dtype=float)
+
+
+def _groups():
+    """(postal code, flat type) of every block and flat type it has, with the model's block features."""
+    blocks = data_registry.get('blocks')
+    has_type = blocks[[f'flat_type_{flat_type}' for flat_type in FLAT_TYPES]].to_numpy() > 0
+    t = get_block_amenities().table
+    amenity_rows = {postal: row for row, postal in enumerate(t['postal_code'])}
+    groups = []
+    for postal, max_floor, types in zip(blocks['postal_code'], blocks['max_floor_lvl'], has_type):
+        row = amenity_rows.get(postal_key(postal))
+        if row is None:
+            continue
+        # rounded as get_information() has them
+        dists = [round(float(t[name][row]), 2) for name in ('school_dist', 'mrt_dist', 'cbd_dist')]
+        storeys = [get_floor_est(max_floor, band) for band in FLOOR_BANDS]
+        groups.extend((postal_key(postal), k, *dists, *storeys) for k in np.flatnonzero(types))
+    return groups
+
+
+def _feature_rows(groups, areas, leases, features=exog):
+    """Model inputs of every grid point of the groups, in (group, band, area, lease) order."""
+    rows = []
+    for postal, k, sch, mrt, cbd, *storeys in groups:
+        area_axis = areas[FLAT_TYPES[k]]
+        storey, area, lease = (axis.ravel() for axis in np.meshgrid(storeys, area_axis, leases, indexing='ij'))
+        x = np.zeros((len(storey), len(features)), dtype=np.float32)
+        x[:, features.index('remaining_lease')] = lease
+        x[:, features.index('min_dist_sch')] = sch
+        x[:, features.index('storey_median')] = storey
+        x[:, features.index('min_dist_mrt')] = mrt
+        x[:, features.index('floor_area_sqm')] = area
+        x[:, features.index('min_dist_cbd')] = cbd
+        x[:, features.index(f'flat_type_{FLAT_TYPES[k]}')] = 1
+        rows.append(x)
+    return np.concatenate(rows)
+
+
+def _init_worker(raw_model, features):
+    global _booster, _features
+    _booster = xgb.Booster()
+    _booster.load_model(raw_model)
+    _features = features
+
+
+def _codes(values):
+    """Smallest unsigned dtype that can index `values`."""
+    return np.uint16 if len(values) <= 2 ** 16 else np.uint32
+
+
+def _predict_groups(task):
+    """Distinct prices of the groups' grid points, and the code of each point's price among them."""
+    groups, areas, leases = task
+    prices = _booster.inplace_predict(_feature_rows(groups, areas, leases, _features), validate_features=False)
+    values, codes = np.unique(prices.astype(np.float32), return_inverse=True)
+    return values, codes.astype(_codes(values))
+
+
+def build_surface(workers=None):
+    """Predictions of the served model over the grid of every block and flat type, as a dict of flat numpy arrays."""
+    predictor = get_predictor()
+    transactions = data_registry.get('transactions')
+    areas = {}
+    for flat_type in FLAT_TYPES:
+        sold = transactions.loc[transactions['flat_type'] == flat_type, 'floor_area_sqm'].dropna()
+        areas[flat_type] = _area_axis(sold.to_numpy(dtype=float)) if len(sold) else np.empty(0)
+    groups = [group for group in _groups() if len(areas[FLAT_TYPES[group[1]]])]
+
+    tasks = [(groups[i:i + GROUPS_PER_TASK], areas, LEASES) for i in range(0, len(groups), GROUPS_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(predictor.booster.save_raw(), predictor.features)) as pool:
+        chunks = list(pool.map(_predict_groups, tasks))
+
+    # a tree ensemble predicts few distinct prices, each cell is the code of its price in price_values
+    sizes = [len(FLOOR_BANDS) * len(areas[FLAT_TYPES[k]]) * len(LEASES) for _, k, *_ in groups]
+    price_values = np.unique(np.concatenate([values for values, _ in chunks] or [np.empty(0, dtype=np.float32)]))
+    price_codes = np.empty(sum(sizes), dtype=_codes(price_values))
+    start = 0
+    for i, (values, codes) in enumerate(chunks):
+        price_codes[start:start + len(codes)] = np.searchsorted(price_values, values)[codes]
+        start += len(codes)
+        chunks[i] = None
+    return {
+        'postal_code': np.array([postal for postal, *_ in groups], dtype=str),
+        'flat_type': np.array([k for _, k, *_ in groups], dtype=np.int8),
+        'storeys': np.array([group[5:] for group in groups], dtype=np.int32).reshape(-1, len(FLOOR_BANDS)),
+        'flat_types': np.array(FLAT_TYPES, dtype=str),
+        'area_values': np.concatenate([areas[flat_type] for flat_type in FLAT_TYPES]),
+        'area_indptr': np.concatenate([[0], np.cumsum([len(areas[flat_type]) for flat_type in FLAT_TYPES])]).astype(np.int64),
+        'leases': LEASES,
+        'cell_indptr': np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+        'price_values': price_values,
+        'price_codes': price_codes,
+        'q': np.array(predictor.q),
+        'model_version': np.array(predictor.version, dtype=str),
+    }
+
+
+def _interpolation(axis, values):
+    """Index of the grid point below each value and the weight of the one above, -1 off the grid."""
+    values = np.asarray(values, dtype=float)
+    lower = np.clip(np.searchsorted(axis, values, side='right') - 1, 0, len(axis) - 2)
+    weight = (values - axis[lower]) / (axis[lower + 1] - axis[lower])
+    off_grid = ~((values >= axis[0]) & (values <= axis[-1]))
+    return np.where(off_grid, -1, lower), weight
+
+
+class PriceSurface:
+    """Valuations of a block's flat on a floor band, interpolated in floor area and remaining lease."""
+
+    def __init__(self, surface):
+        self.surface = surface
+        self.q = float(surface['q'])
+        self.groups = {(postal, int(k)): g for g, (postal, k) in
+                       enumerate(zip(surface['postal_code'], surface['flat_type']))}
+
+    def _areas(self, k):
+        indptr = self.surface['area_indptr']
+        return self.surface['area_values'][indptr[k]:indptr[k + 1]]
+
+    def _prices(self, g, k, band, area, lease):
+        """Interpolated prediction of the groups g of flat type k, NaN off the grid."""
+        areas, leases = self._areas(k), self.surface['leases']
+        a, wa = _interpolation(areas, area)
+        l, wl = _interpolation(leases, lease)
+        inside = (a >= 0) & (l >= 0)
+        base = self.surface['cell_indptr'][g] + (band * len(areas) + a) * len(leases) + l
+        base = np.where(inside, base, 0)
+        step = len(leases)  # the next area is one lease axis further
+        price = [self.surface['price_values'][self.surface['price_codes'][cell]]
+                 for cell in (base, base + 1, base + step, base + step + 1)]
+        p = (1 - wa) * (1 - wl) * price[0] + (1 - wa) * wl * price[1] + wa * (1 - wl) * price[2] + wa * wl * price[3]
+        return np.where(inside, p, np.nan)
+
+    def predict(self, postal_code, flat_type, storey, area, lease):
+        """(prediction, lower, upper) of one flat, or None if it is not on the surface."""
+        if flat_type not in FLAT_TYPES:
+            return None
+        k = FLAT_TYPES.index(flat_type)
+        g = self.groups.get((postal_key(postal_code), k))
+        if g is None:
+            return None
+        bands = np.flatnonzero(self.surface['storeys'][g] == storey)
+        if not len(bands):
+            return None
+        y_pred = np.float32(self._prices(g, k, bands[0], area, lease))
+        if np.isnan(y_pred):
+            return None
+        q = np.float32(self.q)
+        # bounds in float32, as conformal_predict() has them
+        return float(y_pred), float(y_pred - q), float(y_pred + q)
+
+    def block_prices(self, flat_type, floor_band, area, lease):
+        """
+        Prediction, lower and upper bound of the flat at every block that has the flat type, as a
+        DataFrame by postal code, e.g. for a price map. Empty if the area or lease is off the grid.
+        """
+        k = FLAT_TYPES.index(flat_type)
+        g = np.flatnonzero(np.asarray(self.surface['flat_type']) == k)
+        band = FLOOR_BANDS.index(floor_band)
+        y_pred = self._prices(g, k, band, np.full(len(g), area), np.full(len(g), lease)).astype(np.float32)
+        keep = ~np.isnan(y_pred)
+        y_pred, q = y_pred[keep], np.float32(self.q)
+        return pd.DataFrame({'postal_code': np.asarray(self.surface['postal_code'])[g][keep],
+                             'y_pred': y_pred, 'y_lower': y_pred - q, 'y_upper': y_pred + q})
+
+
+def _flat(features):
+    """(flat type, storey, area, lease) of get_information()'s features, None for a flat without a type."""
+    flat_type = next((name for name in FLAT_TYPES if features.get(f'flat_type_{name}') == 1), None)
+    if flat_type is None:
+        return None
+    return flat_type, features.get('storey_median'), features.get('floor_area_sqm'), features.get('remaining_lease')
+
+
+@lru_cache(maxsize=None)
+def _mapped_surface(path, index_mtime):
+    return PriceSurface(map_array_dir(path))
+
+
+def get_price_surface(path=SURFACE_PATH):
+    """The surface built for the current model and datasets, or None if there is none."""
+    index = array_dir_index(path)
+    if is_stale(index, SOURCES):
+        return None
+    surface = _mapped_surface(path, os.path.getmtime(index))
+    return surface if str(surface.surface['model_version']) == get_predictor().version else None
+
+
+def predict(postal_code, features):
+    """(prediction, lower, upper) of a flat from get_information()'s features, from the surface if it has it."""
+    surface = get_price_surface()
+    flat = _flat(features) if surface is not None else None
+    result = surface.predict(postal_code, *flat) if flat is not None else None
+    return result if result is not None else get_predictor().predict(features)
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    surface = build_surface()
+    save_array_dir(SURFACE_PATH, surface)
+    print(f"Wrote {len(surface['postal_code'])} blocks and flat types, {len(surface['price_codes'])} valuations "
+          f"({sum(values.nbytes for values in surface.values()) / 2 ** 20:.1f} MB) to {SURFACE_PATH} "
+          f"in {time.perf_counter() - start:.1f}s")
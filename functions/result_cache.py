@@ -0,0 +1,98 @@
+"""
+In-process LRU cache of computed results, shared by every callback and session of a worker.
+
+    cache = LRUCache(max_entries=256, max_bytes=64 * 2 ** 20, sizeof=frame_bytes)
+    key = canonical_key(town=town, flat_type=flat_type, max_dist_mrt=max_mrt)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.put(key, result)
+
+Entries are evicted least recently used first, once there are more than max_entries of them or
+their sizes add up to more than max_bytes, and expire ttl seconds after they were put if one is
+given. Cached values are shared, callers must not change them.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def canonical_key(**values):
+    """
+    Hashable key of some keyword values, the same for equivalent filters: values that apply no
+    filter (None, 0, '') are dropped, and numbers compare by value (50 and 50.0 are one key).
+    """
+    key = []
+    for name, value in sorted(values.items()):
+        if value is None or value == 0 or value == '':
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = round(float(value), 6)
+        key.append((name, value))
+    return tuple(key)
+
+
+def frame_bytes(df):
+    """
+    Size of a DataFrame, for LRUCache(sizeof=...). Categoricals count only their codes, their
+    categories are shared with the dataset the frame was filtered from.
+    """
+    size = df.index.nbytes
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            size += values.cat.codes.nbytes
+        else:
+            size += values.memory_usage(index=False, deep=True)
+    return int(size)
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by number of entries and total size in bytes, with optional expiry."""
+
+    def __init__(self, max_entries=128, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.entries = OrderedDict()  # key -> (value, size, monotonic time it expires at or None)
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self.bytes -= self.entries.pop(key)[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, ttl=None):
+        size = self.sizeof(value)
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            # a value bigger than the whole cache is not kept
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self.entries[key] = (value, size, expires)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses}
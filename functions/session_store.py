@@ -0,0 +1,47 @@
+"""
+Server-side store of results a later callback of the same page needs but the browser doesn't,
+e.g. every transaction behind the table of the output page, read again when a row is clicked.
+
+    key = store.put(full_records)       # sent to the page through a dcc.Store
+    full_records = store.get(key)       # None once evicted or expired
+
+Every result is put under a random key of its own and the page holds only that key, so a
+session only ever reads its own results and never overwrites another's. Results are kept in
+memory up to max_bytes (least recently used evicted first) and expire ttl seconds after they
+were put. Given a directory, they are also written there: any worker of the host then finds a
+result another worker put, and a result evicted from memory is read back from disk. A result
+can always be gone by the time it is read, callers recompute it from the page's inputs.
+"""
+
+import pickle
+import uuid
+
+from functions.callback_cache import MISSING, DiskBackend
+from functions.result_cache import LRUCache
+
+
+class ResultStore:
+    """Results by random key, bounded in memory, optionally written through to a directory."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 2 ** 20, ttl=60 * 60, directory=None):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes,
+                               sizeof=lambda value: len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        self.disk = DiskBackend(directory, max_bytes=4 * max_bytes) if directory else None
+
+    def put(self, value):
+        key = uuid.uuid4().hex
+        self.memory.put(key, value, self.ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, self.ttl)
+        return key
+
+    def get(self, key):
+        if not key:
+            return None
+        value = self.memory.get(key, MISSING)
+        if value is MISSING and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not MISSING:
+                self.memory.put(key, value, self.ttl)
+        return None if value is MISSING else value
@@ -0,0 +1,41 @@
+"""
+Offsets index over the transactions partitioned by (town, flat type, month).
+
+The registry's 'transactions_by_town' dataset holds the transactions sorted by town, then flat
+type, then month. Every (town, flat type) pair is then one contiguous block of rows, with its
+months in order, so any town / flat type / window of months is a single row slice: no boolean
+mask over the whole history, and the work done per request grows with the size of the answer.
+"""
+
+import numpy as np
+
+
+class TransactionPartitions:
+    """(town, flat type) -> (start, stop) rows of a frame sorted by town, flat type and month."""
+
+    def __init__(self, df):
+        self.df = df
+        town = df['town'].to_numpy(dtype=object)
+        flat_type = df['flat_type'].to_numpy(dtype=object)
+        self.months = df['month'].to_numpy(dtype=object)
+
+        # a new partition starts wherever the (town, flat type) pair changes
+        changed = np.flatnonzero((town[1:] != town[:-1]) | (flat_type[1:] != flat_type[:-1])) + 1
+        starts = np.concatenate([[0], changed]) if len(df) else np.empty(0, dtype=np.int64)
+        stops = np.append(starts[1:], len(df))
+        self.offsets = {(town[start], flat_type[start]): (start, stop) for start, stop in zip(starts, stops)}
+
+    def rows(self, town, flat_type, first_month=None, last_month=None):
+        """Slice of the rows of one town and flat type, optionally within [first_month, last_month] ('YYYY-MM')."""
+        start, stop = self.offsets.get((town, flat_type), (0, 0))
+        months = self.months[start:stop]
+        if first_month is not None:
+            start, stop = start + np.searchsorted(months, first_month, side='left'), stop
+            months = self.months[start:stop]
+        if last_month is not None:
+            stop = start + np.searchsorted(months, last_month, side='right')
+        return slice(int(start), int(stop))
+
+    def select(self, town, flat_type, first_month=None, last_month=None):
+        """The transactions of one town and flat type as a view, see rows()."""
+        return self.df.iloc[self.rows(town, flat_type, first_month, last_month)]
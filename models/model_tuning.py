@@ -150,19 +150,35 @@ import pandas as pd
 #     return bst
 
 ## for conformal prediction 
+# Features of the model, in the order it was trained on
+exog = ['remaining_lease', 'min_dist_sch', 'storey_median', 'min_dist_mrt',
+    'floor_area_sqm', 'min_dist_cbd', 'flat_type_1 ROOM', 'flat_type_2 ROOM', 
+    'flat_type_3 ROOM', 'flat_type_4 ROOM', 'flat_type_5 ROOM', 'flat_type_EXECUTIVE', 
+    'flat_type_MULTI-GENERATION']
+
 def conformal_predict(model, X_input, q):
     """
     Returns prediction and (lower, upper) bounds of the conformal prediction interval
     X_input in [[exog]] format
     q is fiexed from above 
     """
-    exog = ['remaining_lease', 'min_dist_sch', 'storey_median', 'min_dist_mrt',
-        'floor_area_sqm', 'min_dist_cbd', 'flat_type_1 ROOM', 'flat_type_2 ROOM', 
-        'flat_type_3 ROOM', 'flat_type_4 ROOM', 'flat_type_5 ROOM', 'flat_type_EXECUTIVE', 
-        'flat_type_MULTI-GENERATION']
     data=pd.DataFrame([X_input], columns=exog)
-    dinput = xgb.DMatrix(data)
-    y_pred = model.predict(dinput)
+    return conformal_predict_batch(model, data, q)
+
+def conformal_predict_batch(model, X, q, chunk_size=100_000):
+    """
+    Prediction and (lower, upper) conformal bounds of many flats at once, e.g. every listing of a town
+    X is a DataFrame with the exog columns (others are ignored) or an N x 13 array in exog order
+    Scored chunk_size rows per booster call, so very large inputs are never copied whole
+    """
+    if isinstance(X, pd.DataFrame):
+        X = X[exog]
+    rows = len(X)
+    y_pred = np.empty(rows, dtype=np.float32)
+    for start in range(0, rows, chunk_size):
+        chunk = X[start:start + chunk_size]
+        values = chunk.to_numpy(dtype=np.float32) if isinstance(chunk, pd.DataFrame) else np.asarray(chunk, dtype=np.float32)
+        y_pred[start:start + len(values)] = model.predict(xgb.DMatrix(values, feature_names=exog))
     y_lower = y_pred - q
     y_upper = y_pred + q
     return y_pred, y_lower, y_upper
@@ -1,15 +1,27 @@
 import dash
-from dash import html, dcc, register_page, callback, Output, Input, State
-import pandas as pd
+from dash import html, dcc, register_page, callback, clientside_callback, ClientsideFunction, Output, Input, State
+from functions import data_registry
 
 # Load and merge data
-hdb_df = pd.read_csv("dataset/hdb_final_dataset.csv")
-hdb_info = pd.read_csv("dataset/hdb_informations.csv")
-hdb_df = pd.merge(hdb_df, hdb_info[['postal_code', 'max_floor_lvl']], on='postal_code', how='left')
+hdb_df = data_registry.get('transactions')
 
 # Preprocess: get unique towns and map postal codes by town
 towns = sorted(hdb_df['town'].dropna().unique())
-town_postal_map = hdb_df.groupby('town')['postal_code'].apply(list).to_dict()
+town_postal_map = hdb_df.groupby('town', observed=True)['postal_code'].apply(list).to_dict()
+
+# Towns and the flat types sold in each, sent once with the page for the clientside callbacks
+town_flat_types = hdb_df.groupby('town', observed=True)[data_registry.FLAT_TYPES].any()
+town_metadata = {
+    'towns': [{'label': town.title(), 'value': town} for town in towns],
+    'flat_types': [
+        {'label': col.replace('flat_type_', '').replace('_', ' ').title(), 'value': col.replace('flat_type_', '')}
+        for col in data_registry.FLAT_TYPES
+    ],
+    'town_flat_types': {
+        town: [col.replace('flat_type_', '') for col in data_registry.FLAT_TYPES if sold[col]]
+        for town, sold in town_flat_types.iterrows()
+    },
+}
 
 # Common styling
 
@@ -68,6 +80,7 @@ layout = html.Div(children =[
                 'color': 'black'
             }
         ),
+    dcc.Store(id='town-metadata', data=town_metadata),
     # Filter choices for users to input
     html.Div([
         html.Label("Town", style={
@@ -207,34 +220,13 @@ layout = html.Div(children =[
 # CALLBACKS
 
 # Callback for dynamic filtering for flat type, only shows types available in both towns
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='resale', function_name='flat_type_options'),
     Output('newbie-flat-type', 'options'),
     Input('newbie-town-dropdown', 'value'),
-    Input('newbie-town-dropdown_2', 'value')
+    Input('newbie-town-dropdown_2', 'value'),
+    State('town-metadata', 'data')
 )
-def update_flat_type_options(town1, town2):
-    if not town1 or not town2:
-        return []
-
-    filtered1 = hdb_df[hdb_df['town'] == town1]
-    filtered2 = hdb_df[hdb_df['town'] == town2]
-
-    flat_type_cols = [
-        'flat_type_1 ROOM', 'flat_type_2 ROOM', 'flat_type_3 ROOM',
-        'flat_type_4 ROOM', 'flat_type_5 ROOM',
-        'flat_type_EXECUTIVE', 'flat_type_MULTI-GENERATION'
-    ]
-
-    counts1 = filtered1[flat_type_cols].sum()
-    counts2 = filtered2[flat_type_cols].sum()
-
-    # Only keep flat types that exist in both towns
-    common_cols = counts1[(counts1 > 0) & (counts2 > 0)].index.tolist()
-
-    return [
-        {'label': col.replace('flat_type_', '').replace('_', ' ').title(), 'value': col.replace('flat_type_', '')}
-        for col in common_cols
-    ]
 
 # Saves input of filters to be passed on to output page
 @callback(
@@ -272,29 +264,17 @@ def save_inputs_and_go(n_clicks, town1, town2, flat_type, floor_level, lease, di
     return filter_data, "/output-general"
 
 # Callback to ensure choice of the 2 towns to not be the same
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='resale', function_name='town_options'),
     Output('newbie-town-dropdown_2', 'options'),
-    Input('newbie-town-dropdown', 'value')
+    Input('newbie-town-dropdown', 'value'),
+    State('town-metadata', 'data')
 )
-def update_second_town_options(town1_selected):
-    if not town1_selected:
-        return [{'label': town.title(), 'value': town} for town in towns]
 
-    return [
-        {'label': town.title(), 'value': town, 'disabled': town == town1_selected}
-        for town in towns
-    ]
-    
 # Callback to ensure choice of the 2 towns to not be the same
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='resale', function_name='town_options'),
     Output('newbie-town-dropdown', 'options'),
-    Input('newbie-town-dropdown_2', 'value')
+    Input('newbie-town-dropdown_2', 'value'),
+    State('town-metadata', 'data')
 )
-def update_first_town_options(town2_selected):
-    if not town2_selected:
-        return [{'label': town.title(), 'value': town} for town in towns]
-
-    return [
-        {'label': town.title(), 'value': town, 'disabled': town == town2_selected}
-        for town in towns
-    ]
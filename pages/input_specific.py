@@ -1,12 +1,12 @@
-from dash import html, dcc, register_page, callback, Output, Input, State, no_update
+from dash import html, dcc, register_page, callback, clientside_callback, ClientsideFunction, Output, Input, State, no_update
 from functions.input_for_model import get_information
 from functions.final_scraper import scraper_guru
 from functions.percentile_floor import get_floor_est
-import pandas as pd
+from functions import data_registry, postal_index, background_jobs
 
 register_page(__name__, path="/input-specific")
 
-hdb_info = pd.read_csv("dataset/hdb_informations.csv")
+hdb_info = data_registry.get('blocks')
 
 
 
@@ -174,6 +174,37 @@ layout = html.Div(
             style={"textAlign": "center", "marginTop": "20px"}
         ),
 
+        # Cancel button and progress, shown while the input is being processed
+        html.Div(
+            html.Button(
+                'Cancel',
+                id='cancel-expert-input',
+                n_clicks=0,
+                style={
+                    'padding': '10px 20px',
+                    'fontSize': '16px',
+                    'cursor': 'pointer',
+                    'backgroundColor': 'white',
+                    'color': '#7F0019',
+                    'fontFamily': 'Inter, sans-serif',
+                    'border': '1px solid #7F0019',
+                    'borderRadius': '8px'
+                }
+            ),
+            id='cancel-expert-container',
+            style={'display': 'none'}
+        ),
+        html.Div(
+            id='expert-progress',
+            style={
+                'display': 'none',
+                'marginTop': '20px',
+                'fontFamily': 'Inter, sans-serif',
+                'textAlign': 'center',
+                'color': '#555'
+            }
+        ),
+
         # Error / Info Output 
         html.Div(
             id='expert-output-dummy',
@@ -192,20 +223,15 @@ layout = html.Div(
 )
 
 # Callback for toggle switch
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='resale', function_name='toggle_input_containers'),
     [Output('manual-input-container','style'),
      Output('guru-input-container','style')],
     Input('input-mode','value')
 )
-def toggle_input_containers(mode):
-    manual_style = {'display':'block','width':'600px','margin':'0 auto','textAlign':'left'}
-    guru_style   = {'display':'none', 'width':'600px','margin':'0 auto','textAlign':'left'}
-    if mode=='manual':
-        return manual_style, guru_style
-    else:
-        return guru_style, manual_style
 
 # Callback to Validate & Redirect to output page
+# Runs as a background job (functions/background_jobs.py), reading a listing can take a minute
 @callback(
     [Output('redirect-location-dummy','pathname'),
      Output('expert-output-dummy','children'),
@@ -219,9 +245,23 @@ def toggle_input_containers(mode):
     State('expert-floor-level-manual','value'),
     State('expert-remaining-lease','value'),
     State('expert-propertyguru-url','value'),
-    State('expert-floor-level-guru','value')
+    State('expert-floor-level-guru','value'),
+    background=True,
+    interval=background_jobs.POLL_INTERVAL,
+    progress=Output('expert-progress', 'children'),
+    progress_default="",
+    cancel=Input('cancel-expert-input', 'n_clicks'),
+    running=[
+        (Output('submit-expert-input', 'disabled'), True, False),
+        (Output('cancel-expert-container', 'style'),
+         {'display': 'block', 'textAlign': 'center', 'marginTop': '15px'}, {'display': 'none'}),
+        (Output('expert-progress', 'style'),
+         {'display': 'block', 'marginTop': '20px', 'fontFamily': 'Inter, sans-serif',
+          'textAlign': 'center', 'color': '#555'}, {'display': 'none'}),
+    ],
+    prevent_initial_call=True
 )
-def capture_expert_input(n, mode, postal, flat, area, floor_m, lease, url, floor_g):
+def capture_expert_input(set_progress, n, mode, postal, flat, area, floor_m, lease, url, floor_g):
     if n and n > 0:
         if mode == 'manual':
             if not all([postal, flat, area, floor_m, lease]):
@@ -232,11 +272,11 @@ def capture_expert_input(n, mode, postal, flat, area, floor_m, lease, url, floor
 
                 # Get street_name from hdb_info
                 postal = str(postal)
-                address_row = hdb_info[hdb_info['postal_code'].astype(str) == postal]
-                if address_row.empty:
+                address_row = postal_index.block(postal, hdb_info)
+                if address_row is None:
                     return no_update, f"No address found for postal code {postal}", no_update, no_update
 
-                street_name = address_row.iloc[0]['address']
+                street_name = address_row['address']
                 full_address = f"{street_name}"
 
                 manual_data = {
@@ -255,19 +295,27 @@ def capture_expert_input(n, mode, postal, flat, area, floor_m, lease, url, floor
         else:
             if not all([url, floor_g]):
                 return no_update, "Please provide the PropertyGuru link and Floor Level.", no_update, no_update
-            guru_scrape = scraper_guru(url)
+
+            def report(attempt, attempts):
+                set_progress(f"Reading the listing, attempt {attempt} of {attempts}...")
+
+            # a listing read once is reused by every worker for a day, a failed read is not kept
+            guru_scrape = background_jobs.remember('listing', url, lambda: scraper_guru(url, progress=report))
+            if not guru_scrape:
+                return no_update, "Could not read this PropertyGuru listing, please check the link or try again.", no_update, no_update
+            set_progress("Estimating the price...")
             postal_code = guru_scrape['postal_code']
             flat_type = guru_scrape['flat_type_label']
             sqm = int(guru_scrape['floor_area_sqm'])
             try:
                 remaining_lease = int(guru_scrape['remaining_lease_year'])
             except (ValueError, TypeError, KeyError):
-                lease_start = hdb_info[hdb_info['postal_code'].astype(str) == str(postal_code)]['year_completed']
-                if lease_start.empty:
+                lease_start = postal_index.block(postal_code, hdb_info)
+                if lease_start is None:
                     raise ValueError(f"Could not find lease start year for postal code {postal_code}")
-                lease_start_year = int(lease_start.iloc[0])
+                lease_start_year = int(lease_start['year_completed'])
                 remaining_lease = 99 - (2025 - lease_start_year)
-            max_floor = hdb_info[hdb_info['postal_code'].astype(str) == postal_code]['max_floor_lvl'].iloc[0]
+            max_floor = postal_index.block(postal_code, hdb_info)['max_floor_lvl']
             floor_est = get_floor_est(max_floor, floor_g)
             formatted_input = get_information(int(postal_code), flat_type, sqm, floor_est, remaining_lease)
             address = str(guru_scrape['address'])
@@ -291,11 +339,11 @@ def update_flat_type_options(postal_code):
     if not postal_code:
         return []
 
-    # Ensure postal code is string for matching
-    filtered = hdb_info[hdb_info['postal_code'].astype(str) == str(postal_code)]
-
-    if filtered.empty:
+    # O(1) lookup of the block, whatever form the postal code is typed in
+    row = postal_index.block_row(postal_code)
+    if row is None:
         return []
+    filtered = hdb_info.iloc[[row]]
 
     flat_type_cols = [
         'flat_type_1 ROOM', 'flat_type_2 ROOM', 'flat_type_3 ROOM',
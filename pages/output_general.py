@@ -1,7 +1,14 @@
-from dash import html, callback, Output, Input, State, register_page, dcc, dash_table, no_update
+from dash import html, callback, clientside_callback, ClientsideFunction, Output, Input, State, ALL, MATCH, ctx, register_page, dcc, dash_table, no_update
 import dash
 import pandas as pd
-from geopy.distance import geodesic
+from functions import data_registry, postal_index
+from functions.amenity_index import get_amenity_index
+from functions.callback_cache import DAY, cached
+from functions.block_amenities import get_block_amenities
+from functions.distances import distance_to
+from functions.price_cube import QUARTERS, get_price_cube
+from functions.result_cache import LRUCache, canonical_key, frame_bytes
+from functions.transaction_partitions import TransactionPartitions
 import dash_leaflet as dl
 import dash_leaflet.express as dlx
 import plotly.express as px
@@ -16,18 +23,19 @@ register_page(__name__, path="/output-general")
 CBD_COORDS = (1.287953, 103.851784) # Used for distance to CBD
 
 # Load data
-hdb_df = pd.read_csv("dataset/hdb_final_dataset.csv", dtype={"postal_code": str}) # Resale transaction dataset
-hdb_info = pd.read_csv("dataset/hdb_informations.csv", dtype={"postal_code": str}) # Dataset containing additional property details of HDB flats
-schools_df = pd.read_csv("dataset/all_primary_schools.csv") # Dataset of all primary schools
-mrt_df = pd.read_csv("dataset/mrt_stations.csv") # Dataset of all MRT exits
-hawker_df = pd.read_csv("dataset/hawkercentercoord.csv") # Dataset of all hawker centers
+hdb_df = data_registry.get('transactions_by_town') # Resale transaction dataset, sorted by town, flat type and month
+amenity_index = get_amenity_index() # Spatial index of all primary schools, MRT exits and hawker centers
+block_amenities = get_block_amenities() # Precomputed nearest amenities of every block, keyed by postal code
 
 
-# Merge data to introduce max_floor_lvl into hdb resale dataset
+# The registry adds max_floor_lvl, floor_category, quarter and display_address to every transaction,
+# keep only the transactions of blocks with a known max_floor_lvl
 hdb_df['postal_code'] = hdb_df['postal_code'].astype(str).str.zfill(6)
-hdb_info['postal_code'] = hdb_info['postal_code'].astype(str).str.zfill(6)
-hdb_df = pd.merge(hdb_df, hdb_info[['postal_code', 'max_floor_lvl']], on='postal_code', how='left')
-hdb_df = hdb_df[hdb_df['max_floor_lvl'].notna()]
+if hdb_df['max_floor_lvl'].isna().any():
+    hdb_df = hdb_df[hdb_df['max_floor_lvl'].notna()]
+partitions = TransactionPartitions(hdb_df) # Rows of any town, flat type and range of months as one slice
+# Filtered transactions of a town, shared by the callbacks of every session
+filtered_cache = LRUCache(max_entries=256, max_bytes=64 * 2 ** 20, sizeof=frame_bytes)
 
 # Styling for rows
 row_style = {
@@ -58,6 +66,62 @@ hawker_icon = {
     "iconSize": [25, 50]
 }
 
+# Keys of the compared towns in the user-filter-store. Each one gets a table of its most popular
+# blocks, property details and a map, with ids {'type': ..., 'town': key} for the pattern-matching
+# callbacks below
+TOWNS = ['town1', 'town2']
+
+# Title and table of the most popular blocks of a town
+def town_table_column(town, i):
+    style = {'width': '48%', 'display': 'inline-block', 'verticalAlign': 'top'}
+    if i > 0:
+        style['marginLeft'] = '4%'
+    return html.Div([
+        html.H4(id={'type': 'town-name', 'town': town}, style={
+            'fontWeight': 'bold',
+            'textAlign': 'left',
+            'fontSize': '20px',
+            'fontFamily': 'Inter, sans-serif',
+            'marginBottom': '10px'
+        }),
+        html.Div(id={'type': 'town-table-container', 'town': town})
+    ], style=style)
+
+# Property details of the block selected in a town's table
+def town_details_box(town):
+    return html.Div([
+        html.H3("Property details", style={
+            'fontWeight': 'bold',
+            'textAlign': 'left',
+            'fontSize': '20px',
+            'fontFamily': 'Inter, sans-serif',
+            'marginBottom': '10px'
+        }),
+        html.Div("No data.", id={'type': 'town-details', 'town': town})
+    ], style={
+        "flex": 1,
+        "border": "1px solid lightgray",
+        "padding": "20px",
+        "borderRadius": "10px",
+        "backgroundColor": "white",
+        "fontFamily": "Inter, sans-serif",
+        "boxSizing": "border-box"
+    })
+
+# Map of the block selected in a town's table and its nearest amenities
+def town_map(town, i):
+    return html.Div([
+        dl.Map(id={'type': 'town-map', 'town': town},
+               center=[1.287953, 103.851784],
+               zoom=15,
+               children=[
+                   dl.TileLayer(url="https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png",
+                                attribution='&copy; <a href="https://carto.com/">CartoDB</a>'),
+                   dl.LayerGroup(id={'type': 'town-map-markers', 'town': town})
+               ],
+               style={'width': '100%', 'height': '400px'})
+    ], style={'flex': '1', 'marginLeft' if i > 0 else 'marginRight': '10px'})
+
 layout = html.Div([
     dcc.Location(id='url'),
     dcc.Store(id='map-center-store', storage_type='memory'),
@@ -268,85 +332,12 @@ layout = html.Div([
                 'marginBottom': '30px'
             }),
             # Transaction tables listing out the 10 most popular houses transacted
-            html.Div([
-                html.Div([
-                    html.H4(id='town1-name', style={
-                        'fontWeight': 'bold',
-                        'textAlign': 'left',
-                        'fontSize': '20px',
-                        'fontFamily': 'Inter, sans-serif',
-                        'marginBottom': '10px'
-                    }),dash_table.DataTable(
-                        id='transaction-table-town1', 
-                        columns=[], 
-                        data=[],     
-                        style_table={'display': 'none'} 
-                    ),
-                    html.Div(id='filter-table-town1')
-                ], style={'width': '48%', 'display': 'inline-block', 'verticalAlign': 'top'}),
-
-                html.Div([
-                    html.H4(id='town2-name', style={
-                        'fontWeight': 'bold',
-                        'textAlign': 'left',
-                        'fontSize': '20px',
-                        'fontFamily': 'Inter, sans-serif',
-                        'marginBottom': '10px'
-                    }),dash_table.DataTable(
-                        id='transaction-table-town2',
-                        columns=[],
-                        data=[],
-                        style_table={'display': 'none'}
-                    ),
-                    html.Div(id='filter-table-town2')
-                ], style={'width': '48%', 'display': 'inline-block', 'verticalAlign': 'top', 'marginLeft': '4%'})
-            ])
+            html.Div([town_table_column(town, i) for i, town in enumerate(TOWNS)])
         ]),
-    # Storing the selected address
-    dcc.Store(id='selected-postal-store'),
-    dcc.Store(id='selected-postal-store-town2'),
 
     html.Hr(),
     # Property details of each town
-    html.Div([
-        html.Div([
-            html.H3("Property details", style={
-                'fontWeight': 'bold',
-                'textAlign': 'left',
-                'fontSize': '20px',
-                'fontFamily': 'Inter, sans-serif',
-                'marginBottom': '10px'
-            }),
-            html.Div(id='property-amenities-container')
-        ], style={
-            "flex": 1,
-            "border": "1px solid lightgray",
-            "padding": "20px",
-            "borderRadius": "10px",
-            "backgroundColor": "white",
-            "fontFamily": "Inter, sans-serif",
-            "boxSizing": "border-box"
-        }),
-
-        html.Div([
-            html.H3("Property details", style={
-                'fontWeight': 'bold',
-                'textAlign': 'left',
-                'fontSize': '20px',
-                'fontFamily': 'Inter, sans-serif',
-                'marginBottom': '10px'
-            }),
-            html.Div(id='property-amenities-container-town2')
-        ], style={
-            "flex": 1,
-            "border": "1px solid lightgray",
-            "padding": "20px",
-            "borderRadius": "10px",
-            "backgroundColor": "white",
-            "fontFamily": "Inter, sans-serif",
-            "boxSizing": "border-box"
-        })
-    ], style={
+    html.Div([town_details_box(town) for town in TOWNS], style={
         'display': 'flex',
         'flexDirection': 'row',
         'justifyContent': 'center',
@@ -363,31 +354,7 @@ layout = html.Div([
             'fontFamily': 'Inter, sans-serif', 'marginBottom' : '40px',
             'fontSize' : '24px'
         }),
-        html.Div([
-            html.Div([
-                dl.Map(id='amenity-map',
-                       center=[1.287953, 103.851784],
-                       zoom=15,
-                       children=[
-                           dl.TileLayer(url="https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png",
-                                        attribution='&copy; <a href="https://carto.com/">CartoDB</a>'),
-                           dl.LayerGroup(id='map-markers')
-                       ],
-                       style={'width': '100%', 'height': '400px'})
-            ], style={'flex': '1', 'marginRight': '10px'}),
-
-            html.Div([
-                dl.Map(id='amenity-map-town2',
-                       center=[1.287953, 103.851784],
-                       zoom=15,
-                       children=[
-                           dl.TileLayer(url="https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png",
-                                        attribution='&copy; <a href="https://carto.com/">CartoDB</a>'),
-                           dl.LayerGroup(id='map-markers-town2')
-                       ],
-                       style={'width': '100%', 'height': '400px'})
-            ], style={'flex': '1', 'marginLeft': '10px'})
-        ], style={
+        html.Div([town_map(town, i) for i, town in enumerate(TOWNS)], style={
             'display': 'flex', 'gap': '20px',
             'width': '100%'
         })
@@ -400,57 +367,53 @@ layout = html.Div([
 
 
 # Function to capture all of the nearest amenities
-def get_all_nearest_amenities(postal_code, hdb_amenities_dist_with_postal, all_primary_schools, mrt_stations, hawkercentrecoord):
-    coord_row = hdb_amenities_dist_with_postal[hdb_amenities_dist_with_postal['postal_code'] == postal_code]
+def get_all_nearest_amenities(postal_code):
+    # Blocks in hdb_informations are a straight lookup in the precomputed table
+    block = block_amenities.get(postal_code)
+    if block is not None:
+        return {
+            'school': (block['school'][0], round(block['school'][1], 2), block['school'][2]),
+            'mrt': (block['mrt'][0], round(block['mrt'][1], 2), block['mrt'][2]),
+            'hawker': (block['hawker'][0], round(block['hawker'][1], 2), block['hawker'][2]),
+            'cbd_dist': round(block['cbd_dist'], 2),
+            'address': block['address'],
+            'coords': block['coords']
+        }
+
+    coord_row = postal_index.block_transactions(postal_code)
     if coord_row.empty:
         return None
 
     hdb_coords = (coord_row.iloc[0]['latitude'], coord_row.iloc[0]['longitude'])
 
-    def nearest_amenity(df, name_col, lat_col='latitude', lon_col='longitude'):
-        nearest = None
-        min_dist = float('inf')
-        for row in df.itertuples(index=False):
-            coords = (getattr(row, lat_col), getattr(row, lon_col))
-            dist = geodesic(hdb_coords, coords).km
-            if dist < min_dist:
-                nearest = (getattr(row, name_col), round(dist, 2))
-                min_dist = dist
-        return nearest
+    # Nearest amenity of a layer in the shared amenity index, as (name, distance, coords)
+    def nearest_amenity(layer):
+        name, dist, coords = amenity_index.nearest_with_name(layer, hdb_coords)
+        if name is None:
+            return None
+        return (name, round(dist, 2), coords)
 
-    school = nearest_amenity(all_primary_schools, 'school')
-    mrt = nearest_amenity(mrt_stations, 'station_name')
-    hawker = nearest_amenity(hawkercentrecoord, 'hc_name')
-    cbd_dist = round(geodesic(hdb_coords, CBD_COORDS).km, 2)
+    school = nearest_amenity('school')
+    mrt = nearest_amenity('mrt')
+    hawker = nearest_amenity('hawker')
+    cbd_dist = round(float(distance_to([hdb_coords], CBD_COORDS)[0]), 2)
 
     return {
         'school': school,
         'mrt': mrt,
         'hawker': hawker,
         'cbd_dist': cbd_dist,
-        'address': coord_row.iloc[0]['address']
+        'address': coord_row.iloc[0]['address'],
+        'coords': hdb_coords
     }
 
-# Function to generate map coordinates for nearby amenities of a given postal code
-def generate_map_markers(postal_code):
-    result = get_all_nearest_amenities(postal_code, hdb_df, schools_df, mrt_df, hawker_df)
-    if result is None:
-        raise dash.exceptions.PreventUpdate
-
-    hdb_row = hdb_df[hdb_df['postal_code'] == postal_code]
-    if hdb_row.empty:
-        raise dash.exceptions.PreventUpdate
-
-    hdb_lat = hdb_row.iloc[0]['latitude']
-    hdb_lon = hdb_row.iloc[0]['longitude']
-    # Finding coords inside of a dataframe
-    def find_coords(name, df, name_col):
-        row = df[df[name_col] == name]
-        return (row.iloc[0]['latitude'], row.iloc[0]['longitude']) if not row.empty else (None, None)
-
-    mrt_lat, mrt_lon = find_coords(result["mrt"][0], mrt_df, 'station_name')
-    sch_lat, sch_lon = find_coords(result["school"][0], schools_df, 'school')
-    hawker_lat, hawker_lon = find_coords(result["hawker"][0], hawker_df, 'hc_name')
+# Function to generate map coordinates for nearby amenities, from get_all_nearest_amenities() of a block
+def generate_map_markers(result):
+    hdb_lat, hdb_lon = result['coords']
+    # Coordinates of the nearest amenities come straight from the index
+    mrt_lat, mrt_lon = result["mrt"][2]
+    sch_lat, sch_lon = result["school"][2]
+    hawker_lat, hawker_lon = result["hawker"][2]
 
     markers = []
     if hdb_lat and hdb_lon:
@@ -479,12 +442,11 @@ def generate_map_markers(postal_code):
     Input('user-filter-store', 'data'),
     Input('summary-toggle', 'value')
 )
-
+@cached(ttl=DAY)
 def update_quarterly_chart(filter_data, summary_toggle):
     if not filter_data:
         raise dash.exceptions.PreventUpdate # Error handling if no inputs were given
     # Getting relevant filters from the input
-    df = hdb_df.copy()
     town = filter_data.get('town1')
     town2 = filter_data.get('town2')
     town = town or "Town 1"
@@ -494,52 +456,15 @@ def update_quarterly_chart(filter_data, summary_toggle):
     lease = filter_data.get('remaining_lease')
     max_mrt = filter_data.get('max_dist_mrt')
     max_sch = filter_data.get('max_dist_school')
-    flat_type_col = f"flat_type_{flat_type}"
-    # Filtering by town
-    df1 = df[(df['town'] == town) & (df[flat_type_col] == 1)].copy()
-    df2 = df[(df['town'] == town2) & (df[flat_type_col] == 1)].copy()
-    # Converting the floors by using storey median
-    for dfx in [df1, df2]:
-        dfx['storey_median'] = pd.to_numeric(dfx['storey_median'], errors='coerce')
-        dfx['low_threshold'] = (dfx['max_floor_lvl'] * 0.25).round()
-        dfx['high_threshold'] = (dfx['max_floor_lvl'] * 0.75).round()
-        # Classifying the floor level as low, median, or high
-        def classify_floor(row):
-            if pd.isna(row['storey_median']) or pd.isna(row['max_floor_lvl']):
-                return None
-            if row['storey_median'] <= row['low_threshold']:
-                return "Low"
-            elif row['storey_median'] > row['high_threshold']:
-                return "High"
-            else:
-                return "Medium"
-
-        dfx['floor_category'] = dfx.apply(classify_floor, axis=1)
-    # Filtering if matches floor level, lease, MRT and school distance
-    if floor_level:
-        df1 = df1[df1['floor_category'] == floor_level]
-        df2 = df2[df2['floor_category'] == floor_level]
-    if lease:
-        df1 = df1[df1['remaining_lease'] >= lease]
-        df2 = df2[df2['remaining_lease'] >= lease]
-    if max_mrt:
-        df1 = df1[df1['min_dist_mrt'] <= max_mrt]
-        df2 = df2[df2['min_dist_mrt'] <= max_mrt]
-    if max_sch:
-        df1 = df1[df1['min_dist_sch'] <= max_sch]
-        df2 = df2[df2['min_dist_sch'] <= max_sch]
-    # Converting months to quarters
-    months = [f"{y}-{m:02d}" for y in [2024, 2025] for m in range(1, 13)][3:15]
-    month_to_q = {m: f"Q{((int(m[5:7]) - 1) // 3) + 1} {m[:4]}" for m in months}
-    # Grouping transactions by quarters
-    df1 = df1[df1['month'].isin(months)]
-    df2 = df2[df2['month'].isin(months)]
-    df1['Quarter'] = df1['month'].map(month_to_q)
-    df2['Quarter'] = df2['month'].map(month_to_q)
+    # Quarterly aggregates of the transactions matching the floor level (low, median or high,
+    # classified by storey median), lease, MRT and school distance, read off the price cube
+    price_cube = get_price_cube()
+    stats1 = price_cube.query(town, flat_type, floor_level, lease, max_mrt, max_sch)
+    stats2 = price_cube.query(town2, flat_type, floor_level, lease, max_mrt, max_sch)
     # Function to compute quarter average
-    def compute_q_avg(df, town_label):
-        quarters = ['Q2 2024', 'Q3 2024', 'Q4 2024', 'Q1 2025']
-        if df.empty:
+    def compute_q_avg(stats, town_label):
+        quarters = QUARTERS
+        if not stats['units_sold'].any():
             return pd.DataFrame({
                 'Quarter': quarters,
                 'adjusted_resale_price': [0] * len(quarters),
@@ -547,18 +472,18 @@ def update_quarterly_chart(filter_data, summary_toggle):
                 'Town': [town_label] * len(quarters)
             }), None
         else:
-            q_avg = df.groupby('Quarter').agg(
-                adjusted_resale_price=('adjusted_resale_price', 'mean'),
-                units_sold=('adjusted_resale_price', 'count')
-            ).fillna(0).round().reset_index()
-            q_avg['Quarter'] = pd.Categorical(q_avg['Quarter'], quarters, ordered=True)
-            q_avg = q_avg.sort_values('Quarter')
+            stats = stats[stats['units_sold'] > 0]
+            q_avg = pd.DataFrame({
+                'Quarter': pd.Categorical(stats.index, quarters, ordered=True),
+                'adjusted_resale_price': (stats['total'] / stats['units_sold']).round().to_numpy(),
+                'units_sold': stats['units_sold'].to_numpy()
+            })
             q_avg['Town'] = town_label
-            return q_avg, df
+            return q_avg, stats
 
 
-    q_avg1, df1_valid = compute_q_avg(df1, town.title())
-    q_avg2, df2_valid = compute_q_avg(df2, town2.title())
+    q_avg1, stats1_valid = compute_q_avg(stats1, town.title())
+    q_avg2, stats2_valid = compute_q_avg(stats2, town2.title())
     combined_avg = pd.concat([q_avg1, q_avg2])
     # Color aethetics of bar chart
     color_map = {
@@ -608,12 +533,13 @@ def update_quarterly_chart(filter_data, summary_toggle):
         )
     )
     # Building the summary statistics of transactions with given filters
-    def build_summary(df, town_name):
-        if df is None or df.empty:
+    def build_summary(stats, town_name):
+        if stats is None or stats.empty:
             return html.Div("No data available.")
-        avg = int(df['adjusted_resale_price'].mean())
-        max_row = df.loc[df['adjusted_resale_price'].idxmax()]
-        min_row = df.loc[df['adjusted_resale_price'].idxmin()]
+        overall = price_cube.overall(stats)
+        avg = int(overall['total'] / overall['units_sold'])
+        max_row = price_cube.transaction(int(overall['max_row']))
+        min_row = price_cube.transaction(int(overall['min_row']))
         max_month = datetime.strptime(max_row['month'], "%Y-%m").strftime("%b %Y")
         min_month = datetime.strptime(min_row['month'], "%Y-%m").strftime("%b %Y")
         return html.Div([
@@ -633,8 +559,8 @@ def update_quarterly_chart(filter_data, summary_toggle):
             "fontFamily": "Inter, sans-serif"
         })
 
-    summary1 = build_summary(df1_valid, town.title())
-    summary2 = build_summary(df2_valid, town2.title())
+    summary1 = build_summary(stats1_valid, town.title())
+    summary2 = build_summary(stats2_valid, town2.title())
     subtitle = f"Based on flats in {town.title()} and {town2.title()} with {flat_type.title()} flat type and same amenity features"
     selected_summary = summary1 if summary_toggle == 'town1' else summary2
 
@@ -652,48 +578,23 @@ def update_quarterly_chart(filter_data, summary_toggle):
         f"{max_sch} km" if max_sch else ""
     )
 
-# Callback to filter and display the table of the first town
-@callback(
-    Output('filter-table-town1', 'children'),
-    Output('selected-postal-store', 'data'),
-    Output('transaction-table-town1', 'active_cell'),
-    Input('user-filter-store', 'data'),
-    Input('url', 'pathname'),
-)
-def update_table(filter_data, pathname):
-    if pathname != "/output-general" or not filter_data:
-        return html.Div("No data."), None, None
-    # Get filters of first town
-    town = filter_data.get('town1')
+# Transactions of one town from last year matching the filters, computed once for every callback and session
+# (the frame is shared, callers must not change it)
+def filtered_transactions(town, filter_data):
     flat_type = filter_data.get('flat_type')
     floor_level = filter_data.get('floor_level')
     lease = filter_data.get('remaining_lease')
     max_mrt = filter_data.get('max_dist_mrt')
     max_sch = filter_data.get('max_dist_school')
-    flat_type_col = f"flat_type_{flat_type}"
-    
-    df = hdb_df[
-        (hdb_df['town'] == town) &
-        (hdb_df[flat_type_col] == 1)
-    ].copy()
-
-    # Floor level classification
-    df['storey_median'] = pd.to_numeric(df['storey_median'], errors='coerce')
-    df['low_threshold'] = (df['max_floor_lvl'] * 0.25).round()
-    df['high_threshold'] = (df['max_floor_lvl'] * 0.75).round()
-
-    def classify_floor(row):
-        if pd.isna(row['storey_median']) or pd.isna(row['max_floor_lvl']):
-            return None
-        if row['storey_median'] <= row['low_threshold']:
-            return "Low"
-        elif row['storey_median'] > row['high_threshold']:
-            return "High"
-        else:
-            return "Medium"
-
-    df['floor_category'] = df.apply(classify_floor, axis=1)
+    key = canonical_key(town=town, flat_type=flat_type, floor_level=floor_level, remaining_lease=lease,
+                        max_dist_mrt=max_mrt, max_dist_school=max_sch)
+    df = filtered_cache.get(key)
+    if df is not None:
+        return df
 
+    # Transactions of the town and flat type from last year only
+    valid_months = [f"{y}-{m:02d}" for y in [2024, 2025] for m in range(1, 13)][3:15]  # Apr 2024 to Mar 2025
+    df = partitions.select(town, flat_type, valid_months[0], valid_months[-1])
     # Apply selected
     if floor_level:
         df = df[df['floor_category'] == floor_level]
@@ -703,44 +604,42 @@ def update_table(filter_data, pathname):
         df = df[df['min_dist_mrt'] <= max_mrt]
     if max_sch:
         df = df[df['min_dist_sch'] <= max_sch]
-
     # Create an address field
-    df['address'] = df['block'].astype(str).str.strip() + " " + df['street_name'].str.title()
-
-    # Filter to transactions from last year only
-    valid_months = [f"{y}-{m:02d}" for y in [2024, 2025] for m in range(1, 13)][3:15]  # Apr 2024 to Mar 2025
-    df = df[df['month'].isin(valid_months)]
-
-    # Group and aggregate for summary table
-    summary_df = df.groupby('address').agg(
-        num_transactions=('adjusted_resale_price', 'count'),
-        min_price=('adjusted_resale_price', 'min'),
-        max_price=('adjusted_resale_price', 'max')
-    ).reset_index()
+    df = df.assign(address=df['display_address'])
 
+    filtered_cache.put(key, df)
+    return df
 
-    summary_df['Price Range'] = summary_df.apply(
-    lambda row: (
-        f"${int(row['min_price']):,} - ${int(row['max_price']):,}"
-        if pd.notna(row['min_price']) and pd.notna(row['max_price'])
-        else "N/A"
-    ),
-    axis=1
+# The 10 blocks with the most units sold in each town's filtered transactions, with their price range,
+# from one groupby over the transactions of all the towns
+def popular_blocks(frames):
+    combined = pd.concat(
+        [df[['address', 'adjusted_resale_price']].assign(town=town) for town, df in frames.items()],
+        ignore_index=True
     )
-
-
-    summary_df = summary_df.rename(columns={
-        'address': 'Address',
-        'num_transactions': 'Units Sold'
-    })[['Address', 'Units Sold', 'Price Range']]
-
-    summary_df = summary_df.sort_values(by='Units Sold', ascending=False).head(10)
-
-    if summary_df.empty:
-        return html.Div("No results."), None, None
-    # Returns a data table, with styling
+    summary = combined.groupby(['town', 'address'], observed=True)['adjusted_resale_price'].agg(['count', 'min', 'max'])
+
+    blocks = {}
+    for town in frames:
+        if town not in summary.index.get_level_values('town'):
+            continue
+        summary_df = summary.loc[town].reset_index()
+        summary_df['Price Range'] = [
+            f"${int(min_price):,} - ${int(max_price):,}" if pd.notna(min_price) and pd.notna(max_price) else "N/A"
+            for min_price, max_price in zip(summary_df['min'], summary_df['max'])
+        ]
+        summary_df = summary_df.rename(columns={
+            'address': 'Address',
+            'count': 'Units Sold'
+        })[['Address', 'Units Sold', 'Price Range']]
+        # Show 10 most popular sorted by number of units sold
+        blocks[town] = summary_df.sort_values(by='Units Sold', ascending=False).head(10)
+    return blocks
+
+# Data table of a town's most popular blocks, with styling, its first row selected
+def transaction_table(town, summary_df):
     return dash_table.DataTable(
-        id='transaction-table-town1',
+        id={'type': 'town-table', 'town': town},
         columns=[{"name": i, "id": i} for i in summary_df.columns],
         data=summary_df.to_dict('records'),
         cell_selectable=True,
@@ -766,121 +665,32 @@ def update_table(filter_data, pathname):
             'borderSpacing': '0 8px'
         },
         page_size=10
-    ), df.to_dict('records'), {'row': 0, 'column': 0, 'column_id': summary_df.columns[0]}
-
+    )
 
-# Callback to filter and display the table of the second town
+# Callback to filter and display the tables of every town at once
 @callback(
-    Output('filter-table-town2', 'children'),
-    Output('selected-postal-store-town2', 'data'),
-    Output('transaction-table-town2', 'active_cell'),
+    Output({'type': 'town-table-container', 'town': ALL}, 'children'),
     Input('user-filter-store', 'data'),
     Input('url', 'pathname'),
 )
-def update_table_town2(filter_data, pathname):
-    if pathname != "/output-general" or not filter_data or not filter_data.get("town2"):
-        return html.Div("No data."), None, None
-    # Get filters of first town
-    town2 = filter_data.get('town2')
-    flat_type = filter_data.get('flat_type')
-    floor_level = filter_data.get('floor_level')
-    lease = filter_data.get('remaining_lease')
-    max_mrt = filter_data.get('max_dist_mrt')
-    max_sch = filter_data.get('max_dist_school')
-    flat_type_col = f"flat_type_{flat_type}"
-    # Filter to transactons of given town and flat type first
-    df = hdb_df[
-        (hdb_df['town'] == town2) &
-        (hdb_df[flat_type_col] == 1)
-    ].copy()
-
-    df['storey_median'] = pd.to_numeric(df['storey_median'], errors='coerce')
-    df['low_threshold'] = (df['max_floor_lvl'] * 0.25).round()
-    df['high_threshold'] = (df['max_floor_lvl'] * 0.75).round()
-    # Same function on classifying floors as before
-    def classify_floor(row):
-        if pd.isna(row['storey_median']) or pd.isna(row['max_floor_lvl']):
-            return None
-        if row['storey_median'] <= row['low_threshold']:
-            return "Low"
-        elif row['storey_median'] > row['high_threshold']:
-            return "High"
+def update_tables(filter_data, pathname):
+    towns = [output['id']['town'] for output in ctx.outputs_list]
+    if pathname != "/output-general" or not filter_data:
+        return [html.Div("No data.") for _ in towns]
+    # Filtered transactions of every town, shared with the other callbacks and sessions
+    frames = {town: filtered_transactions(filter_data[town], filter_data) for town in towns if filter_data.get(town)}
+    blocks = popular_blocks(frames) if frames else {}
+
+    tables = []
+    for town in towns:
+        if town not in frames:
+            tables.append(html.Div("No data."))
+        elif town not in blocks or blocks[town].empty:
+            tables.append(html.Div("No results."))
         else:
-            return "Medium"
-
-    df['floor_category'] = df.apply(classify_floor, axis=1)
-    # Filter by other inputs
-    if floor_level:
-        df = df[df['floor_category'] == floor_level]
-    if lease:
-        df = df[df['remaining_lease'] >= lease]
-    if max_mrt:
-        df = df[df['min_dist_mrt'] <= max_mrt]
-    if max_sch:
-        df = df[df['min_dist_sch'] <= max_sch]
-    # Make addressx
-    df['address'] = df['block'].astype(str).str.strip() + " " + df['street_name'].str.title()
-
-    # Filter to last year
-    valid_months = [f"{y}-{m:02d}" for y in [2024, 2025] for m in range(1, 13)][3:15]
-    df = df[df['month'].isin(valid_months)]
-    # Creating summary statistics
-    summary_df = df.groupby('address').agg(
-        num_transactions=('adjusted_resale_price', 'count'),
-        min_price=('adjusted_resale_price', 'min'),
-        max_price=('adjusted_resale_price', 'max')
-    ).reset_index()
-    # State price ranges
-    summary_df['Price Range'] = summary_df.apply(
-    lambda row: (
-        f"${int(row['min_price']):,} - ${int(row['max_price']):,}"
-        if pd.notna(row['min_price']) and pd.notna(row['max_price'])
-        else "N/A"
-    ),
-    axis=1
-    )
-
+            tables.append(transaction_table(town, blocks[town]))
+    return tables
 
-    summary_df = summary_df.rename(columns={
-        'address': 'Address',
-        'num_transactions': 'Units Sold'
-    })[['Address', 'Units Sold', 'Price Range']]
-    # Show 10 most popular sorted by number of units sold
-    summary_df = summary_df.sort_values(by='Units Sold', ascending=False).head(10)
-
-
-    if summary_df.empty:
-        return html.Div("No results."), None, None
-    
-    return dash_table.DataTable(
-        id='transaction-table-town2',
-        columns=[{"name": i, "id": i} for i in summary_df.columns],
-        data=summary_df.to_dict('records'),
-        cell_selectable=True,
-        active_cell={'row': 0, 'column': 0, 'column_id': summary_df.columns[0]},
-        style_cell={
-            'fontFamily': 'Inter, sans-serif',
-            'textAlign': 'left',
-            'padding': '16px',
-            'border': 'none',
-            'fontSize': '15px',
-            'backgroundColor': '#f9f9f9',
-        },
-        style_header={
-            'backgroundColor': '#ffffff',
-            'fontWeight': 'bold',
-            'borderBottom': '2px solid #dddddd',
-            'fontSize': '16px',
-        },
-        style_table={
-            'width': '100%',
-            'marginTop': '10px',
-            'borderCollapse': 'separate',
-            'borderSpacing': '0 8px'
-        },
-        selected_rows=[],
-        page_size=10
-    ), df.to_dict('records'),  {'row': 0, 'column': 0, 'column_id': summary_df.columns[0]}
 # Function to ease making markers of nearest amenities
 def make_amenity(icon, title, value):
     return html.Div([
@@ -899,29 +709,30 @@ def make_amenity(icon, title, value):
         "display": "flex", "alignItems": "flex-start", "marginBottom": "20px"
     })
 
-# Callback to update details on click on first town
+# Callback to update the details and the map of a town when a row of its table is clicked
 @callback(
-    Output('property-amenities-container', 'children'),
-    Input('transaction-table-town1', 'active_cell'),
-    State('transaction-table-town1', 'data'),
-    State('selected-postal-store', 'data')
+    Output({'type': 'town-details', 'town': MATCH}, 'children'),
+    Output({'type': 'town-map-markers', 'town': MATCH}, 'children'),
+    Output({'type': 'town-map', 'town': MATCH}, 'center'),
+    Input({'type': 'town-table', 'town': MATCH}, 'active_cell'),
+    State({'type': 'town-table', 'town': MATCH}, 'data'),
+    State('user-filter-store', 'data')
 )
-def display_details_split(active_cell, table_data, original_data):
-    if not active_cell or not table_data or not original_data:
-        return "No data."
+def update_property_details(active_cell, table_data, filter_data):
+    town = filter_data.get(ctx.outputs_list[0]['id']['town']) if filter_data else None
+    if not active_cell or not table_data or not town:
+        return "No data.", no_update, no_update
 
+    # The block's postal code from the same filtered transactions the table was made of
     selected_address = table_data[active_cell['row']]['Address']
+    df = filtered_transactions(town, filter_data)
+    postal_codes = df.loc[df['address'] == selected_address, 'postal_code']
+    if postal_codes.empty:
+        return html.Div("⚠️ Address not found"), no_update, no_update
 
-    for row in original_data:
-        if row['address'] == selected_address:
-            postal = row['postal_code']
-            break
-    else:
-        return html.Div("⚠️ Address not found")
-
-    result = get_all_nearest_amenities(postal, hdb_df, schools_df, mrt_df, hawker_df)
+    result = get_all_nearest_amenities(postal_codes.iloc[0])
     if result is None:
-        return html.Div("⚠️ Unable to retrieve details.")
+        return html.Div("⚠️ Unable to retrieve details."), no_update, no_update
     # List of amenities
     amenities = [
         make_amenity("location_marker.svg", "Address", result['address']),
@@ -930,136 +741,15 @@ def display_details_split(active_cell, table_data, original_data):
         make_amenity("utensil.svg", "Nearest Hawker Center", f"{result['hawker'][0]}, {result['hawker'][1]} km"),
         make_amenity("city.svg", "Distance to CBD", f"{result['cbd_dist']} km")
     ]
-    return amenities
-
-# Callback to update details on click on second town, same as first town
-@callback(
-    Output('property-amenities-container-town2', 'children'),
-    Input('transaction-table-town2', 'active_cell'),
-    State('transaction-table-town2', 'data'),
-    State('selected-postal-store-town2', 'data')
-)
-def display_details_split_town2(active_cell, table_data, original_data):
-    if not active_cell or not table_data or not original_data:
-        return "No data."
-
-    selected_address = table_data[active_cell['row']]['Address']
-
-    for row in original_data:
-        if row['address'] == selected_address:
-            postal = row['postal_code']
-            break
-    else:
-        return html.Div("⚠️ Address not found")
-
-    result = get_all_nearest_amenities(postal, hdb_df, schools_df, mrt_df, hawker_df)
-    if result is None:
-        return html.Div("⚠️ Unable to retrieve details.")
-    
-    amenities = [
-        make_amenity("location_marker.svg", "Address", result['address']),
-        make_amenity("mrt.svg", "Nearest MRT", f"{result['mrt'][0]}, {result['mrt'][1]} km"),
-        make_amenity("edu.svg", "Nearest Primary School", f"{result['school'][0]}, {result['school'][1]} km"),
-        make_amenity("utensil.svg", "Nearest Hawker Center", f"{result['hawker'][0]}, {result['hawker'][1]} km"),
-        make_amenity("city.svg", "Distance to CBD", f"{result['cbd_dist']} km")
-    ]
-    return amenities
-
-# Callback to update map with respect to clicked transaction on the first town
-@callback(
-    Output('map-markers', 'children'),
-    Output('amenity-map', 'center'),
-    Input('transaction-table-town1', 'active_cell'),
-    State('transaction-table-town1', 'data'),
-    State('selected-postal-store', 'data')
+    markers, center = generate_map_markers(result)
+    return amenities, markers, center
+
+# Highlights the selected row of a town's table, the first row when the page is opened
+clientside_callback(
+    ClientsideFunction(namespace='resale', function_name='style_active_row'),
+    Output({'type': 'town-table', 'town': MATCH}, 'style_data_conditional'),
+    Input({'type': 'town-table', 'town': MATCH}, 'active_cell')
 )
-def update_map_and_center(active_cell, table_data, original_data):
-    if not active_cell or not table_data or not original_data:
-        raise dash.exceptions.PreventUpdate
-
-    selected_address = table_data[active_cell['row']]['Address']
-    for row in original_data:
-        if row['address'] == selected_address:
-            postal_code = str(row['postal_code']).zfill(6)
-            break
-    else:
-        raise dash.exceptions.PreventUpdate
-
-    return generate_map_markers(postal_code)
-
-# Callback to update map with respect to clicked transaction on the second town
-@callback(
-    Output('map-markers-town2', 'children'),
-    Output('amenity-map-town2', 'center'),
-    Input('transaction-table-town2', 'active_cell'),
-    State('transaction-table-town2', 'data'),
-    State('selected-postal-store-town2', 'data')
-)
-def update_map_and_center_town2(active_cell, table_data, original_data):
-    if not active_cell or not table_data or not original_data:
-        raise dash.exceptions.PreventUpdate
-
-    selected_address = table_data[active_cell['row']]['Address']
-    for row in original_data:
-        if row['address'] == selected_address:
-            postal_code = str(row['postal_code']).zfill(6)
-            break
-    else:
-        raise dash.exceptions.PreventUpdate
-
-    return generate_map_markers(postal_code)
-
-# Defines an active cell, so that when users enter the page the first row of town 1 is already clicked
-@callback(
-    Output('transaction-table-town1', 'style_data_conditional'),
-    Input('transaction-table-town1', 'active_cell')
-)
-def style_active_row_town1(active_cell):
-    style = [
-        {
-            'if': {'row_index': 'odd'},
-            'backgroundColor': '#fcfcfc',
-        },
-        {
-            'if': {'row_index': 'even'},
-            'backgroundColor': '#f9f9f9',
-        }
-    ]
-    if active_cell:
-        row_idx = active_cell['row']
-        style.append({
-            'if': {'row_index': row_idx},
-            'backgroundColor': '#7F0019',
-            'color': 'white',
-            'borderTop': '2px solid #dddddd'
-        })
-    return style
-
-# Same function as before, but for town 2
-@callback(
-    Output('transaction-table-town2', 'style_data_conditional'),
-    Input('transaction-table-town2', 'active_cell')
-)
-def style_active_row_town2(active_cell):
-    style = [
-        {
-            'if': {'row_index': 'odd'},
-            'backgroundColor': '#fcfcfc',
-        },
-        {
-            'if': {'row_index': 'even'},
-            'backgroundColor': '#f9f9f9',
-        }
-    ]
-    if active_cell:
-        row_idx = active_cell['row']
-        style.append({
-            'if': {'row_index': row_idx},
-            'backgroundColor': '#7F0019',
-            'color': 'white',
-            'borderTop': '2px solid #dddddd'
-        })
-    return style
 
 # Callback to state the name of the towns in the toggle bar for the summary
 @callback(
@@ -1082,12 +772,13 @@ def update_toggle_options(filter_data):
 
 # Callback to extract town names
 @callback(
-    Output('town1-name', 'children'),
-    Output('town2-name', 'children'),
+    Output({'type': 'town-name', 'town': ALL}, 'children'),
     Input('user-filter-store', 'data'),
 )
 def update_town_titles(filter_data):
-    town1 = filter_data.get('town1', 'Town 1') if filter_data else 'Town 1'
-    town2 = filter_data.get('town2', 'Town 2') if filter_data else 'Town 2'
-    return town1.title(), town2.title()
+    titles = []
+    for i, output in enumerate(ctx.outputs_list):
+        town = filter_data.get(output['id']['town'], f'Town {i + 1}') if filter_data else f'Town {i + 1}'
+        titles.append(town.title())
+    return titles
 
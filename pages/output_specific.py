@@ -1,13 +1,15 @@
 import dash
-from dash import html, dcc, Input, Output, State, callback, register_page, ctx, dash_table
+from dash import html, dcc, Input, Output, State, callback, clientside_callback, ClientsideFunction, register_page, ctx, dash_table
 from dash.exceptions import PreventUpdate
 import dash_leaflet as dl
 import joblib
-import xgboost as xgb
 import pandas as pd
-from models.model_tuning import conformal_predict
+from functions.callback_cache import DAY, cached
 from functions.get_transactions import get_transactions, get_block_transactions
 from functions.input_for_model import get_all_nearest_amenities  
+from functions import price_surface
+from functions.session_store import ResultStore
+import os
 import tempfile
 
 register_page(__name__, path="/output-specific")
@@ -16,13 +18,6 @@ register_page(__name__, path="/output-specific")
 # model = model_package['model']
 # q_value = model_package['q_value']
 
-bst = xgb.Booster()
-bst.load_model("models/xgb_model.bin")
-
-with open("models/q_value.txt", "r") as f:
-    q_value = float(f.read())
-model = bst
-
 
 layout = html.Div([
     # back link to home page
@@ -69,6 +64,8 @@ layout = html.Div([
     html.Div([
         html.H4("Recent Transactions", style={"fontFamily": "Inter, sans-serif", "fontSize": '18px'}),
         html.Div(id='recent-transactions-label', style={"fontFamily": "Inter, sans-serif"}),
+        # key of the table's transactions in records_store
+        dcc.Store(id='transaction-records-key'),
         dash_table.DataTable(
             id='transaction-table',
             columns=[
@@ -178,13 +175,14 @@ def display_prediction(manual_data, guru_data):
             flat_type = data.get("flat_type_input", "[flat type]")
             address = data.get("address", "[address]")
 
-            y_pred, y_lower, y_upper = conformal_predict(model, input_vector, q_value)
+            # looked up on the precomputed price surface, or predicted live if it doesn't have the flat
+            y_pred, y_lower, y_upper = price_surface.predict(data.get("postal"), input_vector)
 
             return (
                 f"A {flat_type} HDB at {address} is predicted to be",
                 html.Div([
-                    html.H1(f"${int(y_pred[0]):,}", style={"color": "#7F0019", "font-size": "48px"}),
-                    html.P(f"With a plausible range of ${int(y_lower[0]):,} to ${int(y_upper[0]):,}",
+                    html.H1(f"${int(y_pred):,}", style={"color": "#7F0019", "font-size": "48px"}),
+                    html.P(f"With a plausible range of ${int(y_lower):,} to ${int(y_upper):,}",
                            style={"font-size": "18px"})
                 ]),
                 f"Based on other {flat_type} sales",
@@ -195,13 +193,17 @@ def display_prediction(manual_data, guru_data):
 
     return "", "", "", ""
 
+# All the transactions behind the table, kept on the server for update_amenities_and_map, the
+# page only holds their key. SESSION_STORE=/path/to/dir shares them between workers
+records_store = ResultStore(directory=os.environ.get("SESSION_STORE"))
+
 # callback to update barchart & summary stats dynamically following the toggle
-stored_records = {}
 @callback(
     Output("price-bar-chart", "figure"),
     Output("summary-stats", "children"),
     Output("transaction-table", "data"),
     Output("transaction-table", "active_cell"),  
+    Output("transaction-records-key", "data"),
     Input("price-trend-toggle", "value"),
     Input("manual-store", "data"),
     Input("guru-store", "data")
@@ -211,15 +213,19 @@ def update_chart(toggle_value, manual_data, guru_data):
     if not data:
         raise PreventUpdate
 
-    postal = data.get("postal")
-    flat_type = data.get("flat_type")
+    outputs, full_records = chart_outputs(toggle_value, data.get("postal"), data.get("flat_type"))
+    return (*outputs, records_store.put(full_records))
 
+# barchart, summary stats and table of a block, with all the transactions shown as records
+# (the same for every session, so cached)
+@cached(ttl=DAY)
+def chart_outputs(toggle_value, postal, flat_type):
     if toggle_value == "1km":
         top3, recent_year, full = get_transactions(postal, flat_type)
     else:
         top3, recent_year, full = get_block_transactions(postal, flat_type)
 
-    stored_records['full'] = full.to_dict('records')  
+    full_records = full.to_dict('records')
     bar_df = recent_year.copy()
     bar_df['quarter'] = pd.to_datetime(bar_df['month']).dt.to_period('Q').astype(str)
     chart_data = (
@@ -267,7 +273,7 @@ def update_chart(toggle_value, manual_data, guru_data):
         }
     }
     if recent_year.empty:
-        return dash.no_update  
+        return (dash.no_update,) * 4, full_records
     max_row = recent_year.loc[recent_year['adjusted_resale_price'].idxmax()]
     min_row = recent_year.loc[recent_year['adjusted_resale_price'].idxmin()]
     avg_price = round(recent_year['adjusted_resale_price'].mean())
@@ -293,21 +299,31 @@ def update_chart(toggle_value, manual_data, guru_data):
         lambda x: f"${int(round(x)):,}"
     )
 
-    return fig, stats_html, top3_formatted.to_dict('records'), {"row": 0, "column": 0, "column_id": "month"}
+    return (fig, stats_html, top3_formatted.to_dict('records'), {"row": 0, "column": 0, "column_id": "month"}), full_records
 
 # callback for bottom part of the page (property details and amenities)
 @callback(
     Output("amenities-list", "children"),
     Output("selected-marker", "children"),
     Output("selected-map", "center"),
-    Input("transaction-table", "active_cell")
+    Input("transaction-table", "active_cell"),
+    State("transaction-records-key", "data"),
+    State("price-trend-toggle", "value"),
+    State("manual-store", "data"),
+    State("guru-store", "data")
 )
-def update_amenities_and_map(active_cell):
+def update_amenities_and_map(active_cell, records_key, toggle_value, manual_data, guru_data):
     if not active_cell:
         raise PreventUpdate
 
     row_idx = active_cell['row']
-    full = stored_records.get('full', [])
+    full = records_store.get(records_key)
+    if full is None:
+        # evicted, expired or put by a worker not sharing the store: the same inputs give the same records
+        data = manual_data if manual_data else guru_data
+        if not data:
+            raise PreventUpdate
+        full = chart_outputs(toggle_value, data.get("postal"), data.get("flat_type"))[1]
 
     if not full or row_idx >= len(full):
         raise PreventUpdate
@@ -323,6 +339,8 @@ def update_amenities_and_map(active_cell):
         "latitude": float(lat),
         "longitude": float(lon)
     }
+    if full_row.get('postal_code') is not None:
+        coord_row['postal_code'] = full_row['postal_code']
 
     nearest = get_all_nearest_amenities(coord_row)
 
@@ -373,32 +391,8 @@ def update_amenities_and_map(active_cell):
 
 
 # callback for styling the highlights of transaction table
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='resale', function_name='style_active_row'),
     Output('transaction-table', 'style_data_conditional'),
     Input('transaction-table', 'active_cell')
 )
-def style_active_row(active_cell):
-    # Base zebra-striping for all rows
-    style = [
-        {
-            'if': {'row_index': 'odd'},
-            'backgroundColor': '#fcfcfc',
-        },
-        {
-            'if': {'row_index': 'even'},
-            'backgroundColor': '#f9f9f9',
-        }
-    ]
-
-    # Add selected row style
-    if active_cell:
-        row_idx = active_cell['row']
-        style.append({
-            'if': {'row_index': row_idx},
-            'backgroundColor': '#7F0019',
-            'color': 'white',
-            'borderTop': '2px solid #dddddd'
-        })
-
-    return style
-